@@ -2,6 +2,9 @@ import arcpy
 import subprocess
 import sys
 import os
+import importlib
+import importlib.metadata
+import importlib.util
 
 class InstallBoto3(object):
     """Install boto3 in ArcGIS Pro Python environment"""
@@ -22,46 +25,61 @@ class InstallBoto3(object):
         messages.addMessage(f"Python: {python_exe}")
         
         # Check if boto3 already installed
-        try:
-            import boto3
-            messages.addMessage(f"boto3 already installed: {boto3.__version__}")
+        # find_spec only consults the import finders, avoiding boto3's costly module init
+        if importlib.util.find_spec("boto3") is not None:
+            try:
+                version = importlib.metadata.version('boto3')
+            except importlib.metadata.PackageNotFoundError:
+                # Importable (vendored or namespace copy) but without dist-info
+                version = "version unknown"
+            messages.addMessage(f"boto3 already installed: {version}")
             return
-        except ImportError:
-            messages.addMessage("boto3 not found, installing...")
+        messages.addMessage("boto3 not found, installing...")
         
         # Install boto3
         try:
-            # Method 1: Using pip directly
+            # Method 1: Using pip directly - one batched, non-interactive, wheel-only call
             messages.addMessage("\nMethod 1: Using pip...")
-            result = subprocess.run(
-                [python_exe, "-m", "pip", "install", "boto3"],
-                capture_output=True,
-                text=True
+            env = {**os.environ, "PIP_DISABLE_PIP_VERSION_CHECK": "1", "PYTHONDONTWRITEBYTECODE": "1"}
+            proc = subprocess.Popen(
+                [python_exe, "-m", "pip", "install",
+                 "--no-input", "--disable-pip-version-check",
+                 "--only-binary=:all:", "--prefer-binary",
+                 "boto3", "botocore", "s3transfer"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+                env=env
             )
+            for line in proc.stdout:
+                messages.addMessage(line.rstrip())
+            returncode = proc.wait()
             
-            if result.returncode == 0:
+            if returncode == 0:
                 messages.addMessage("[+] Successfully installed boto3")
-                messages.addMessage(result.stdout)
             else:
                 messages.addMessage("[-] pip install failed")
-                messages.addMessage(result.stderr)
                 
                 # Method 2: Using conda if available
                 messages.addMessage("\nMethod 2: Trying conda...")
                 conda_exe = os.path.join(os.path.dirname(python_exe), "Scripts", "conda.exe")
                 
                 if os.path.exists(conda_exe):
-                    result = subprocess.run(
+                    proc = subprocess.Popen(
                         [conda_exe, "install", "-y", "boto3"],
-                        capture_output=True,
-                        text=True
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.STDOUT,
+                        text=True,
+                        bufsize=1
                     )
+                    for line in proc.stdout:
+                        messages.addMessage(line.rstrip())
                     
-                    if result.returncode == 0:
+                    if proc.wait() == 0:
                         messages.addMessage("[+] Successfully installed via conda")
                     else:
                         messages.addMessage("[-] conda install also failed")
-                        messages.addMessage(result.stderr)
                 else:
                     messages.addMessage("[-] conda not found")
                     
@@ -69,10 +87,10 @@ class InstallBoto3(object):
             messages.addErrorMessage(f"Installation failed: {str(e)}")
             
         # Verify installation
-        try:
-            import boto3
-            messages.addMessage(f"\n[+] Verification: boto3 {boto3.__version__} is now installed!")
-        except ImportError:
+        importlib.invalidate_caches()
+        if importlib.util.find_spec("boto3") is not None:
+            messages.addMessage(f"\n[+] Verification: boto3 {importlib.metadata.version('boto3')} is now installed!")
+        else:
             messages.addMessage("\n[-] boto3 still not available")
             messages.addMessage("You may need to:")
             messages.addMessage("1. Run as administrator")
@@ -1,8 +1,185 @@
 import arcpy
+import io
 import os
+import shutil
+import string
+import sys
 import requests
 import json
+import configparser
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from pathlib import Path
+from requests.adapters import HTTPAdapter, Retry
+
+# Shared keep-alive session so repeated probes reuse the TLS connection
+_SESSION = requests.Session()
+_SESSION.headers["Connection"] = "keep-alive"
+_SESSION.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=8,
+                                       max_retries=Retry(total=2, backoff_factor=0.2)))
+
+# Authentication methods to try, in priority order: (name, api_key -> headers)
+# CRITICAL: "api-key" must be first - this is what works!
+_AUTH_TEMPLATES = (
+    ("api-key", lambda k: {'api-key': k}),  # <-- THIS IS THE ONE THAT WORKS!
+    ("x-api-key", lambda k: {'x-api-key': k}),  # header names are case-insensitive (RFC 7230)
+    ("Authorization Bearer", lambda k: {'Authorization': f'Bearer {k}'}),
+    ("Authorization apikey", lambda k: {'Authorization': f'apikey {k}'})
+)
+
+def _probe(api_url, headers):
+    """HEAD first so rejected headers skip the backend; GET only when a response body is needed"""
+    head = _SESSION.head(api_url, headers=headers, timeout=5, allow_redirects=False)
+    # 401, or API Gateway's ForbiddenException (bad/missing key), is a definite rejection.
+    # Anything else (200, 405, a gateway that has no HEAD route) is settled by a real GET.
+    if head.status_code == 401 or (head.status_code == 403 and
+                                   "Forbidden" in head.headers.get("x-amzn-ErrorType", "")):
+        return head
+    return _SESSION.get(api_url, headers=headers, timeout=10)
+
+def _write_atomic(path, text):
+    """Writes text in one call to a temp file, then swaps it in so readers never see a partial file"""
+    tmp = Path(path + ".tmp")
+    tmp.write_text(text, encoding='utf-8')
+    os.replace(tmp, path)
+
+def _is_key(line, key):
+    """True for an unindented 'key = value' line (indented lines belong to a nested block)"""
+    return line[:1] not in (" ", "\t") and line.partition("=")[0].strip() == key and "=" in line
+
+def _set_profile_config(text, section, region):
+    """Sets region and s3 addressing_style in one ~/.aws/config section, leaving all other lines as they are"""
+    lines = text.splitlines()
+    start = next((i for i, line in enumerate(lines) if line.strip() == f"[{section}]"), None)
+    if start is None:
+        if lines and lines[-1].strip():
+            lines.append("")
+        lines += [f"[{section}]", f"region = {region}", "s3 =", "    addressing_style = virtual"]
+        return "\n".join(lines) + "\n"
+    
+    # The section runs to the next header; trailing blank lines stay after it
+    end = next((i for i in range(start + 1, len(lines)) if lines[i].startswith("[")), len(lines))
+    while end > start + 1 and not lines[end - 1].strip():
+        end -= 1
+    body = lines[start + 1:end]
+    
+    region_at = next((i for i, line in enumerate(body) if _is_key(line, "region")), None)
+    if region_at is None:
+        body.insert(0, f"region = {region}")
+    else:
+        body[region_at] = f"region = {region}"
+    
+    s3_at = next((i for i, line in enumerate(body) if _is_key(line, "s3")), None)
+    if s3_at is None:
+        body += ["s3 =", "    addressing_style = virtual"]
+    else:
+        # Nested s3 settings are the indented lines that follow
+        nested_end = s3_at + 1
+        while nested_end < len(body) and body[nested_end][:1] in (" ", "\t") and body[nested_end].strip():
+            nested_end += 1
+        style_at = next((i for i in range(s3_at + 1, nested_end)
+                         if body[i].partition("=")[0].strip() == "addressing_style"), None)
+        if style_at is None:
+            body.insert(nested_end, "    addressing_style = virtual")
+        else:
+            body[style_at] = "    addressing_style = virtual"
+    
+    lines[start + 1:end] = body
+    return "\n".join(lines) + "\n"
+
+# Python used to run the generated credential script, resolved once per session
+_PY_EXE = None
+
+def _python_exe():
+    """Locates a Python executable via a PATH scan instead of spawning candidates"""
+    global _PY_EXE
+    if _PY_EXE is None:
+        _PY_EXE = shutil.which("python") or shutil.which("python3") or shutil.which("py") or sys.executable
+    return _PY_EXE
+
+# Template for the get_temp_creds_{profile}.py script written by Step 1
+_CRED_SCRIPT_TMPL = string.Template('''#!/usr/bin/env python3
+import os
+import json
+import requests
+from datetime import datetime, timezone, timedelta
+from requests.adapters import HTTPAdapter, Retry
+
+try:
+    from orjson import loads as _loads
+except ImportError:
+    _loads = json.loads
+
+CACHE_FILE = os.path.expanduser("~/.aws/credentials_cache_${profile_name}.json")
+API_URL = "${api_url}"
+API_KEY = "${api_key}"
+EXPIRATION_THRESHOLD = timedelta(minutes=5)  # Refresh if expiring within 5 min
+
+# Keep-alive session reused for every credential refresh in this process
+SESSION = requests.Session()
+SESSION.headers["Connection"] = "keep-alive"
+SESSION.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=8,
+                                      max_retries=Retry(total=2, backoff_factor=0.2)))
+
+# Parsed cache keyed by (mtime_ns, size) so unchanged files are not re-read
+_MEMO = {}
+
+def _remember(st, data):
+    """Stores parsed credentials and their expiration for the given stat result."""
+    expiration_time = datetime.fromisoformat(data.get("Expiration")).replace(tzinfo=timezone.utc)
+    _MEMO.clear()
+    _MEMO[(st.st_mtime_ns, st.st_size)] = (data, expiration_time)
+    return data, expiration_time
+
+def get_cached_credentials():
+    """Reads cached credentials if they exist and are valid."""
+    try:
+        st = os.stat(CACHE_FILE)
+    except OSError:
+        return None
+    try:
+        hit = _MEMO.get((st.st_mtime_ns, st.st_size))
+        if hit is None:
+            with open(CACHE_FILE, "rb") as f:
+                hit = _remember(st, _loads(f.read()))
+        data, expiration_time = hit
+        current_time = datetime.now(timezone.utc)  # Ensure UTC comparison
+        if current_time < (expiration_time - EXPIRATION_THRESHOLD):
+            return data  # Return valid cached credentials
+        return None  # Expired or invalid credentials
+    except:
+        return None
+
+def fetch_new_credentials():
+    """Fetches new credentials from the API and saves them to cache."""
+    try:
+        # USING THE WORKING HEADER: ${working_method}
+        response = SESSION.get(API_URL, headers={"${working_method}": API_KEY}, timeout=5)
+        response.raise_for_status()
+        credentials = _loads(response.content)
+        
+        # Ensure Version field exists (required by AWS)
+        if 'Version' not in credentials:
+            credentials['Version'] = 1
+            
+        # Ensure Expiration is stored as a proper UTC timestamp
+        if 'Expiration' in credentials:
+            credentials["Expiration"] = datetime.fromisoformat(credentials["Expiration"]).replace(tzinfo=timezone.utc).isoformat()
+            
+        # Save to cache
+        with open(CACHE_FILE, "w") as f:
+            json.dump(credentials, f)
+        if 'Expiration' in credentials:
+            _remember(os.stat(CACHE_FILE), credentials)
+        return credentials
+    except (requests.RequestException, ValueError) as e:
+        print(json.dumps({"error": f"Failed to fetch credentials: {str(e)}"}))
+        exit(1)
+
+if __name__ == "__main__":
+    credentials = get_cached_credentials() or fetch_new_credentials()
+    print(json.dumps(credentials))  # AWS CLI reads this output
+''')
 
 class SetupAWSCredentials(object):
     """Step 1: Setup AWS Credentials by calling API and updating credentials file"""
@@ -78,37 +255,53 @@ class SetupAWSCredentials(object):
         messages.addMessage("\nTesting API connection...")
         try:
             # Try different authentication methods
-            # CRITICAL: "api-key" must be first - this is what works!
-            auth_methods = [
-                ("api-key", {'api-key': api_key}),  # <-- THIS IS THE ONE THAT WORKS!
-                ("x-api-key", {'x-api-key': api_key}),
-                ("X-API-Key", {'X-API-Key': api_key}),
-                ("X-Api-Key", {'X-Api-Key': api_key}),
-                ("Authorization Bearer", {'Authorization': f'Bearer {api_key}'}),
-                ("Authorization apikey", {'Authorization': f'apikey {api_key}'})
-            ]
+            auth_methods = [(name, make_headers(api_key)) for name, make_headers in _AUTH_TEMPLATES]
             
-            messages.addMessage(f"\nWill test {len(auth_methods)} authentication methods:")
+            messages.addMessage(f"\nTesting {len(auth_methods)} authentication methods concurrently:")
             
+            # Probe every method at once; the first 200 cancels whatever is still pending
+            results = {}
+            executor = ThreadPoolExecutor(max_workers=len(auth_methods))
+            try:
+                futures = {
+                    executor.submit(_probe, api_url, headers): i
+                    for i, (method_name, headers) in enumerate(auth_methods)
+                }
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        results[i] = future.result()
+                    except Exception as e:
+                        results[i] = e
+                        continue
+                    if results[i].status_code == 200:
+                        for f in futures:
+                            f.cancel()
+                        break
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+            
+            # Report in priority order and pick the highest-priority success
             response = None
             working_method = None
             
-            for i, (method_name, headers) in enumerate(auth_methods, 1):
-                try:
-                    messages.addMessage(f"\n[{i}/{len(auth_methods)}] Testing: {method_name}")
-                    messages.addMessage(f"     Headers: {headers}")
-                    
-                    response = requests.get(api_url, headers=headers, timeout=10)
-                    messages.addMessage(f"     Response: {response.status_code}")
-                    
-                    if response.status_code == 200:
-                        working_method = method_name
-                        messages.addMessage(f"     SUCCESS with {method_name}!")
-                        break
+            for i, (method_name, headers) in enumerate(auth_methods):
+                messages.addMessage(f"\n[{i + 1}/{len(auth_methods)}] Testing: {method_name}")
+                messages.addMessage(f"     Headers: {headers}")
+                result = results.get(i)
+                if result is None:
+                    messages.addMessage("     Skipped (another method already succeeded)")
+                elif isinstance(result, Exception):
+                    messages.addMessage(f"     [-] Error: {str(result)}")
+                else:
+                    messages.addMessage(f"     Response: {result.status_code}")
+                    if result.status_code == 200:
+                        if not working_method:
+                            working_method = method_name
+                            response = result
+                            messages.addMessage(f"     SUCCESS with {method_name}!")
                     else:
-                        messages.addMessage(f"     [-] Failed: {response.text[:100]}")
-                except Exception as e:
-                    messages.addMessage(f"     [-] Error: {str(e)}")
+                        messages.addMessage(f"     [-] Failed: {result.text[:100] or result.reason}")
             
             if not working_method:
                 messages.addErrorMessage("\nERROR: Could not authenticate with API")
@@ -129,70 +322,19 @@ class SetupAWSCredentials(object):
             
             # Step 2: Create get_temp_creds.py script
             aws_dir = os.path.join(os.path.expanduser("~"), ".aws")
-            if not os.path.exists(aws_dir):
-                os.makedirs(aws_dir)
-                messages.addMessage(f"\nCreated directory: {aws_dir}")
+            os.makedirs(aws_dir, exist_ok=True)
             
             script_path = os.path.join(aws_dir, f"get_temp_creds_{profile_name}.py")
             
-            # Create script content that matches the working version with caching
-            script_content = f'''#!/usr/bin/env python3
-import os
-import json
-import requests
-from datetime import datetime, timezone, timedelta
-
-CACHE_FILE = os.path.expanduser("~/.aws/credentials_cache_{profile_name}.json")
-API_URL = "{api_url}"
-API_KEY = "{api_key}"
-EXPIRATION_THRESHOLD = timedelta(minutes=5)  # Refresh if expiring within 5 min
-
-def get_cached_credentials():
-    """Reads cached credentials if they exist and are valid."""
-    if not os.path.exists(CACHE_FILE):
-        return None
-    try:
-        with open(CACHE_FILE, "r") as f:
-            data = json.load(f)
-        expiration_time = datetime.fromisoformat(data.get("Expiration")).replace(tzinfo=timezone.utc)
-        current_time = datetime.now(timezone.utc)  # Ensure UTC comparison
-        if current_time < (expiration_time - EXPIRATION_THRESHOLD):
-            return data  # Return valid cached credentials
-        return None  # Expired or invalid credentials
-    except:
-        return None
-
-def fetch_new_credentials():
-    """Fetches new credentials from the API and saves them to cache."""
-    try:
-        # USING THE WORKING HEADER: {working_method}
-        response = requests.get(API_URL, headers={{"{working_method}": API_KEY}}, timeout=5)
-        response.raise_for_status()
-        credentials = response.json()
-        
-        # Ensure Version field exists (required by AWS)
-        if 'Version' not in credentials:
-            credentials['Version'] = 1
+            # Credential script that matches the working version with caching
+            script_content = _CRED_SCRIPT_TMPL.substitute(
+                profile_name=profile_name,
+                api_url=api_url,
+                api_key=api_key,
+                working_method=working_method
+            )
             
-        # Ensure Expiration is stored as a proper UTC timestamp
-        if 'Expiration' in credentials:
-            credentials["Expiration"] = datetime.fromisoformat(credentials["Expiration"]).replace(tzinfo=timezone.utc).isoformat()
-            
-        # Save to cache
-        with open(CACHE_FILE, "w") as f:
-            json.dump(credentials, f)
-        return credentials
-    except requests.RequestException as e:
-        print(json.dumps({{"error": f"Failed to fetch credentials: {{str(e)}}"}}))
-        exit(1)
-
-if __name__ == "__main__":
-    credentials = get_cached_credentials() or fetch_new_credentials()
-    print(json.dumps(credentials))  # AWS CLI reads this output
-'''
-            
-            with open(script_path, 'w', encoding='utf-8') as f:
-                f.write(script_content)
+            _write_atomic(script_path, script_content)
             messages.addMessage(f"\n[+] Created script: {script_path}")
             messages.addMessage(f"  - Uses header: {working_method}")
             messages.addMessage("  - Includes credential caching")
@@ -201,57 +343,86 @@ if __name__ == "__main__":
             # Step 3: Update ~/.aws/credentials
             creds_path = os.path.join(aws_dir, "credentials")
             
-            # Read existing credentials
-            existing_creds = ""
-            if os.path.exists(creds_path):
-                with open(creds_path, 'r', encoding='utf-8') as f:
-                    existing_creds = f.read()
-                messages.addMessage(f"\nFound existing credentials file with {len(existing_creds.split('[')) - 1} profiles")
+            # Read existing credentials (no interpolation: values are written back verbatim)
+            cp = configparser.ConfigParser(interpolation=None)
+            if cp.read(creds_path, encoding='utf-8'):
+                messages.addMessage(f"\nFound existing credentials file with {len(cp.sections())} profiles")
             
-            # Remove existing profile if present
-            if f"[{profile_name}]" in existing_creds:
+            # Replace existing profile if present
+            if cp.remove_section(profile_name):
                 messages.addMessage(f"Removing existing [{profile_name}] profile...")
-                lines = existing_creds.split('\n')
-                new_lines = []
-                skip = False
-                for line in lines:
-                    if line.strip() == f"[{profile_name}]":
-                        skip = True
-                    elif skip and line.strip().startswith('['):
-                        skip = False
-                    if not skip:
-                        new_lines.append(line)
-                existing_creds = '\n'.join(new_lines)
-                
-                # Clean up extra blank lines
-                while '\n\n\n' in existing_creds:
-                    existing_creds = existing_creds.replace('\n\n\n', '\n\n')
-            
-            # Add new profile
-            if not existing_creds.endswith('\n'):
-                existing_creds += '\n'
-            new_profile = f"\n[{profile_name}]\ncredential_process = python \"{script_path}\"\nregion = {aws_region}\n"
+            cp[profile_name] = {
+                "credential_process": f'python "{script_path}"',
+                "region": aws_region
+            }
             
-            with open(creds_path, 'w', encoding='utf-8') as f:
-                f.write(existing_creds + new_profile)
+            buf = io.StringIO()
+            cp.write(buf)
+            _write_atomic(creds_path, buf.getvalue())
             
             messages.addMessage(f"\n[+] Updated credentials file: {creds_path}")
             messages.addMessage(f"[+] Added profile: [{profile_name}]")
             
+            # Step 4: Profile settings in ~/.aws/config plus a shared-session helper
+            aws_config_path = os.path.join(aws_dir, "config")
+            try:
+                config_text = Path(aws_config_path).read_text(encoding='utf-8')
+            except FileNotFoundError:
+                config_text = ""
+            section = "default" if profile_name == "default" else f"profile {profile_name}"
+            # Edit the lines in place: configparser would drop comments and other settings
+            _write_atomic(aws_config_path, _set_profile_config(config_text, section, aws_region))
+            messages.addMessage(f"[+] Updated config file: {aws_config_path}")
+            
+            helper_path = os.path.join(aws_dir, f"session_{profile_name}.py")
+            helper_content = f'''"""Shared boto3 session for the {profile_name} profile.
+
+Import get_session()/get_s3_client() instead of calling boto3.client() repeatedly:
+every fresh client re-runs credential_process and opens new connections.
+"""
+PROFILE = "{profile_name}"
+REGION = "{aws_region}"
+
+_SESSION = None
+_S3_CLIENT = None
+
+def get_session():
+    """Returns the process-wide boto3 session, creating it on first use."""
+    global _SESSION
+    if _SESSION is None:
+        import boto3
+        _SESSION = boto3.session.Session(profile_name=PROFILE, region_name=REGION)
+    return _SESSION
+
+def get_s3_client():
+    """Returns a pooled keep-alive S3 client bound to the shared session."""
+    global _S3_CLIENT
+    if _S3_CLIENT is None:
+        from botocore.config import Config
+        _S3_CLIENT = get_session().client("s3", config=Config(
+            tcp_keepalive=True,
+            max_pool_connections=16,
+            retries={{"max_attempts": 4, "mode": "adaptive"}}
+        ))
+    return _S3_CLIENT
+'''
+            _write_atomic(helper_path, helper_content)
+            messages.addMessage(f"[+] Created session helper: {helper_path}")
+            
             # Save configuration for Step 2
             config_path = os.path.join(aws_dir, f"{profile_name}_config.json")
             config = {
                 "profile_name": profile_name,
                 "region": aws_region,
                 "api_url": api_url,
-                "api_key": api_key[:10] + "..." if len(api_key) > 10 else api_key,
+                "api_key": api_key,  # already stored in plain text in the credential script
                 "created": datetime.now().isoformat(),
                 "script_path": script_path,
+                "python_exe": _python_exe(),
                 "auth_method": working_method,
-                "auth_header_key": list(auth_methods[0][1].keys())[0]  # Store the exact header key
+                "auth_header_key": next(iter(dict(auth_methods)[working_method]))  # Header key of the working method
             }
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=2)
+            _write_atomic(config_path, json.dumps(config, indent=2))
             
             messages.addMessage(f"\n[+] Saved configuration: {config_path}")
             
@@ -261,39 +432,30 @@ if __name__ == "__main__":
             try:
                 import subprocess
                 
-                # Try to find python executable
-                python_cmds = ["python", "python3", "py"]
-                python_exe = None
+                python_exe = _python_exe()
+                messages.addMessage(f"Found Python: {python_exe}")
                 
-                for cmd in python_cmds:
-                    try:
-                        result = subprocess.run([cmd, "--version"], capture_output=True, text=True)
-                        if result.returncode == 0:
-                            python_exe = cmd
-                            messages.addMessage(f"Found Python: {cmd} ({result.stdout.strip()})")
-                            break
-                    except:
-                        continue
-                
-                if not python_exe:
-                    messages.addMessage("WARNING: Could not find Python executable")
-                    return
-                
-                result = subprocess.run(
+                # Parse the script's stdout straight from the pipe
+                with subprocess.Popen(
                     [python_exe, script_path],
-                    capture_output=True,
-                    text=True,
-                    check=False
-                )
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True
+                ) as proc:
+                    try:
+                        test_creds = json.load(proc.stdout)
+                    except json.JSONDecodeError:
+                        test_creds = None
+                    stderr = proc.stderr.read()
+                    returncode = proc.wait()
                 
-                if result.returncode == 0:
-                    test_creds = json.loads(result.stdout)
+                if returncode == 0 and test_creds is not None:
                     messages.addMessage("Script test successful!")
                     messages.addMessage(f"  - AccessKeyId: {test_creds.get('AccessKeyId', 'N/A')[:10]}...")
                     messages.addMessage(f"  - Expires: {test_creds.get('Expiration', 'N/A')}")
                 else:
                     messages.addMessage("WARNING: Script test failed")
-                    messages.addMessage(f"Error: {result.stderr}")
+                    messages.addMessage(f"Error: {stderr}")
                     messages.addMessage("The script was created but may need manual testing")
             except Exception as e:
                 messages.addMessage(f"WARNING: Could not test script: {str(e)}")
@@ -302,7 +464,10 @@ if __name__ == "__main__":
             messages.addMessage("[+] Setup complete! Now run Step 2 to create ACS files.")
             messages.addMessage(f"\nProfile created: {profile_name}")
             messages.addMessage(f"Script location: {script_path}")
+            messages.addMessage(f"Session helper: {helper_path}")
             messages.addMessage("\nNote: Credentials are cached and auto-refresh before expiration.")
+            messages.addMessage("Tip: in your own boto3 code import get_session()/get_s3_client() from the")
+            messages.addMessage("     session helper rather than creating a new boto3.client per call.")
             
         except Exception as e:
             messages.addErrorMessage(f"Error: {str(e)}")
@@ -3,10 +3,50 @@ import os
 import subprocess
 import json
 import configparser
+import functools
+
+# Parses credential_process output from its stdout pipe: orjson on the raw bytes
+# when available, otherwise the stdlib parser reading the binary stream
+try:
+    import orjson
+
+    def _load(fp):
+        return orjson.loads(fp.read())
+except ImportError:
+    _load = json.load
+
+
+@functools.lru_cache(maxsize=8)
+def _load_profiles(path, mtime_ns):
+    """Profile names in an AWS credentials file; mtime_ns keys the cache to the file version"""
+    config = configparser.ConfigParser()
+    config.read(path)
+    return tuple(config.sections())
+
+
+@functools.lru_cache(maxsize=8)
+def _load_profile_config(path, mtime_ns):
+    """Parsed Step 1 {profile}_config.json; mtime_ns keys the cache to the file version"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
 
 class CreateACSFromProfile(object):
     """Step 2: Create ACS files from AWS profile in credentials file"""
     
+    # Bucket selection -> (bucket name, connection name suffix appended to the prefix)
+    _BUCKETS = {
+        "NASA Disasters (nasa-disasters)": (("nasa-disasters", None),),
+        "VEDA Production (veda-data-store)": (("veda-data-store", "prod"),),
+        "VEDA Development (veda-data-store-dev)": (("veda-data-store-dev", "dev"),),
+        "VEDA Staging (veda-data-store-staging)": (("veda-data-store-staging", "staging"),),
+        "All VEDA Buckets": (
+            ("veda-data-store", "prod"),
+            ("veda-data-store-dev", "dev"),
+            ("veda-data-store-staging", "staging")
+        )
+    }
+    
     def __init__(self):
         self.label = "Step 2: Create ACS from AWS Profile"
         self.description = """Reads credentials from ~/.aws/credentials profile and creates ACS files
@@ -28,9 +68,7 @@ class CreateACSFromProfile(object):
         # Try to read available profiles
         creds_path = os.path.join(os.path.expanduser("~"), ".aws", "credentials")
         if os.path.exists(creds_path):
-            config = configparser.ConfigParser()
-            config.read(creds_path)
-            profiles = config.sections()
+            profiles = list(_load_profiles(creds_path, os.stat(creds_path).st_mtime_ns))
             if profiles:
                 param0.filter.type = "ValueList"
                 param0.filter.list = profiles
@@ -115,14 +153,42 @@ class CreateACSFromProfile(object):
         profile_name = parameters[0].value
         if profile_name:
             config_path = os.path.join(os.path.expanduser("~"), ".aws", f"{profile_name}_config.json")
-            if os.path.exists(config_path):
-                try:
-                    with open(config_path, 'r') as f:
-                        config = json.load(f)
-                        if 'region' in config:
-                            parameters[5].value = config['region']
-                except:
-                    pass
+            try:
+                config = _load_profile_config(config_path, os.stat(config_path).st_mtime_ns)
+                if 'region' in config:
+                    parameters[5].value = config['region']
+            except:
+                pass
+
+    def _make_acs(self, output_folder, conn_name, bucket_name, access_key, secret_key, aws_region, session_token):
+        """Create one ACS file; returns (acs_path, whether the session token was used)"""
+        # Note: Session tokens may not work in all ArcGIS versions
+        if session_token:
+            try:
+                arcpy.management.CreateCloudStorageConnectionFile(
+                    output_folder,
+                    conn_name,
+                    "AMAZON",
+                    bucket_name,
+                    access_key,
+                    secret_key,
+                    aws_region,
+                    session_token=session_token
+                )
+                return os.path.join(output_folder, f"{conn_name}.acs"), True
+            except:
+                # Fall back to creating without session token
+                pass
+        arcpy.management.CreateCloudStorageConnectionFile(
+            output_folder,
+            conn_name,
+            "AMAZON",
+            bucket_name,
+            access_key,
+            secret_key,
+            aws_region
+        )
+        return os.path.join(output_folder, f"{conn_name}.acs"), False
 
     def execute(self, parameters, messages):
         profile_name = parameters[0].valueAsText
@@ -162,21 +228,34 @@ class CreateACSFromProfile(object):
         # Execute the credential process
         messages.addMessage("\nFetching temporary credentials...")
         try:
-            # Parse the command (handle quotes and spaces)
-            import shlex
-            cmd_parts = shlex.split(cred_process)
+            # Step 1 records the interpreter and script it wrote into credential_process;
+            # use them directly and only shell-lex commands it did not generate
+            config_path = os.path.join(os.path.expanduser("~"), ".aws", f"{profile_name}_config.json")
+            try:
+                profile_config = _load_profile_config(config_path, os.stat(config_path).st_mtime_ns)
+                script_path = profile_config["script_path"]
+                python_exe = profile_config["python_exe"]
+                if script_path not in cred_process:
+                    raise ValueError("credential_process was changed after Step 1")
+                cmd_parts = [python_exe, script_path]
+            except (OSError, KeyError, ValueError):
+                import shlex
+                cmd_parts = shlex.split(cred_process)
             
-            # Run the command
-            result = subprocess.run(
+            # Run the command and parse credentials straight from its stdout pipe
+            with subprocess.Popen(
                 cmd_parts,
-                capture_output=True,
-                text=True,
-                check=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
                 shell=False
-            )
-            
-            # Parse credentials
-            creds = json.loads(result.stdout)
+            ) as proc:
+                try:
+                    creds = _load(proc.stdout)
+                finally:
+                    # A failed process takes precedence over the resulting parse error
+                    stderr = proc.stderr.read()
+                    if proc.wait() != 0:
+                        raise subprocess.CalledProcessError(proc.returncode, cmd_parts, stderr=stderr)
             
             access_key = creds.get('AccessKeyId')
             secret_key = creds.get('SecretAccessKey')
@@ -185,77 +264,34 @@ class CreateACSFromProfile(object):
             
             if not access_key or not secret_key:
                 messages.addErrorMessage("Invalid credentials returned")
-                messages.addMessage(f"Response: {result.stdout}")
+                messages.addMessage(f"Response fields: {list(creds.keys())}")
                 return
                 
             messages.addMessage("✓ Retrieved temporary credentials")
             messages.addMessage(f"Expires: {expiration}")
             
             # Determine buckets to create
-            bucket_map = {
-                "NASA Disasters (nasa-disasters)": [("nasa-disasters", connection_prefix)],
-                "VEDA Production (veda-data-store)": [("veda-data-store", f"{connection_prefix}-prod")],
-                "VEDA Development (veda-data-store-dev)": [("veda-data-store-dev", f"{connection_prefix}-dev")],
-                "VEDA Staging (veda-data-store-staging)": [("veda-data-store-staging", f"{connection_prefix}-staging")],
-                "All VEDA Buckets": [
-                    ("veda-data-store", f"{connection_prefix}-prod"),
-                    ("veda-data-store-dev", f"{connection_prefix}-dev"),
-                    ("veda-data-store-staging", f"{connection_prefix}-staging")
-                ],
-                "Custom": [(custom_bucket, f"{connection_prefix}-custom")] if custom_bucket else []
-            }
-            
-            buckets = bucket_map.get(bucket_selection, [])
+            buckets = [
+                (bucket_name, f"{connection_prefix}-{suffix}" if suffix else connection_prefix)
+                for bucket_name, suffix in self._BUCKETS.get(bucket_selection, ())
+            ]
+            if bucket_selection == "Custom" and custom_bucket:
+                buckets = [(custom_bucket, f"{connection_prefix}-custom")]
             
             # Create ACS files
             messages.addMessage(f"\nCreating {len(buckets)} ACS file(s)...")
             created = 0
             
+            # Geoprocessing tools aren't thread-safe, so the files are created one at a time
             for bucket_name, conn_name in buckets:
+                messages.addMessage(f"\nCreating connection for: {bucket_name}")
                 try:
-                    messages.addMessage(f"\nCreating connection for: {bucket_name}")
-                    
-                    # Create the ACS file
-                    # Note: Session tokens may not work in all ArcGIS versions
-                    if session_token:
-                        try:
-                            arcpy.management.CreateCloudStorageConnectionFile(
-                                output_folder,
-                                conn_name,
-                                "AMAZON",
-                                bucket_name,
-                                access_key,
-                                secret_key,
-                                aws_region,
-                                session_token=session_token
-                            )
-                        except:
-                            # Try without session token
-                            messages.addWarning("Creating without session token")
-                            arcpy.management.CreateCloudStorageConnectionFile(
-                                output_folder,
-                                conn_name,
-                                "AMAZON",
-                                bucket_name,
-                                access_key,
-                                secret_key,
-                                aws_region
-                            )
-                    else:
-                        arcpy.management.CreateCloudStorageConnectionFile(
-                            output_folder,
-                            conn_name,
-                            "AMAZON",
-                            bucket_name,
-                            access_key,
-                            secret_key,
-                            aws_region
-                        )
-                    
-                    acs_path = os.path.join(output_folder, f"{conn_name}.acs")
+                    acs_path, with_token = self._make_acs(output_folder, conn_name, bucket_name,
+                                                          access_key, secret_key, aws_region, session_token)
+                    if session_token and not with_token:
+                        messages.addWarning("Creating without session token")
                     messages.addMessage(f"✓ Created: {acs_path}")
                     created += 1
-                    
                 except Exception as e:
                     messages.addErrorMessage(f"Failed for {bucket_name}: {str(e)}")
             
@@ -266,10 +302,11 @@ class CreateACSFromProfile(object):
                 
         except subprocess.CalledProcessError as e:
             messages.addErrorMessage("Failed to run credential_process")
-            messages.addErrorMessage(f"Error: {e.stderr}")
-        except json.JSONDecodeError as e:
+            messages.addErrorMessage(f"Error: {e.stderr.decode(errors='replace') if e.stderr else ''}")
+        except ValueError as e:
+            # json.JSONDecodeError and orjson.JSONDecodeError are both ValueErrors
             messages.addErrorMessage("Failed to parse credentials JSON")
-            messages.addErrorMessage(f"Output: {result.stdout}")
+            messages.addErrorMessage(f"Error: {str(e)}")
         except Exception as e:
             messages.addErrorMessage(f"Unexpected error: {str(e)}")
             
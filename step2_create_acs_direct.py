@@ -2,10 +2,140 @@ import arcpy
 import os
 import requests
 import json
+import functools
+import re
+import time
+from pathlib import Path
+from requests.adapters import HTTPAdapter, Retry
+
+# Shared keep-alive session so repeated runs reuse the TLS connection to the API
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                                       max_retries=Retry(total=2, backoff_factor=0.2,
+                                                         status_forcelist=[429, 500, 502, 503, 504],
+                                                         raise_on_status=False)))
+
+# orjson when available: parses bytes and serializes straight to bytes
+try:
+    import orjson
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+# API details embedded in the get_temp_creds script generated by Step 1
+_SCRIPT_RE = re.compile(r'API_(URL|KEY)\s*=\s*["\']([^"\']+)["\']')
+
+@functools.lru_cache(maxsize=16)
+def _extract_api(script_path, mtime_ns):
+    """Returns (api_url, api_key) from one scan of the script; None for any not found.
+    mtime_ns keys the cache to the file version."""
+    with open(script_path, 'r') as f:
+        script_content = f.read()
+    found = {}
+    for m in _SCRIPT_RE.finditer(script_content):
+        found.setdefault(m.group(1), m.group(2))
+        if len(found) == 2:
+            break
+    return found.get('URL'), found.get('KEY')
+
+# Home directory resolved once (registry/passwd lookup); user paths expanded through a cache
+_HOME = os.path.expanduser("~")
+_expanduser = functools.lru_cache(maxsize=8)(os.path.expanduser)
+
+# profile_name -> (loaded at, parsed config or None); updateParameters runs on every
+# dialog change, so keep recent lookups (including misses) for a couple of seconds
+_cfg_cache = {}
+_CFG_TTL = 2.0
+
+def _profile_config(profile_name):
+    """Step 1 config for a profile, or None if missing/unreadable, cached for _CFG_TTL"""
+    now = time.monotonic()
+    entry = _cfg_cache.get(profile_name)
+    if entry and now - entry[0] < _CFG_TTL:
+        return entry[1]
+    config_path = os.path.join(_HOME, ".aws", f"{profile_name}_config.json")
+    try:
+        with open(config_path, 'rb') as f:
+            config = _loads(f.read())
+    except (OSError, ValueError):
+        config = None
+    _cfg_cache[profile_name] = (now, config)
+    return config
+
+# Only these fields of the credential API response are used
+_CRED_FIELDS = ('AccessKeyId', 'SecretAccessKey', 'SessionToken', 'Expiration')
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+def _fetch_credentials(api_url, headers):
+    """GETs the credential API; returns (response, creds) keeping only _CRED_FIELDS (None unless 200)"""
+    with _SESSION.get(api_url, headers=headers, timeout=(3.05, 27), stream=True) as response:  # (connect, read)
+        if response.status_code != 200:
+            response.content  # load the body before the connection goes back to the pool
+            return response, None
+        creds = {}
+        if ijson is not None:
+            # Incremental parse straight off the socket; other fields are never materialized.
+            # Read to the end so the connection can return to the keep-alive pool.
+            response.raw.decode_content = True
+            for key, value in ijson.kvitems(response.raw, ''):
+                if key in _CRED_FIELDS:
+                    creds[key] = value
+        else:
+            parsed = _loads(response.content)
+            creds = {k: parsed[k] for k in _CRED_FIELDS if k in parsed}
+    return response, creds
+
+# Session token ACS method (1-3) that last succeeded in this ArcGIS session
+_acs_method = None
+
+def _write_acs(path, data):
+    """Writes the serialized ACS bytes in one call"""
+    Path(path).write_bytes(data)
+
+class _MessageBuffer(object):
+    """Collects addMessage lines and hands them to ArcGIS as a single message per flush"""
+    
+    def __init__(self, messages):
+        self._messages = messages
+        self._lines = []
+    
+    def addMessage(self, text):
+        self._lines.append(text)
+    
+    def addErrorMessage(self, text):
+        # Keep ordering: pending lines go out before the error
+        self.flush()
+        self._messages.addErrorMessage(text)
+    
+    def flush(self):
+        if self._lines:
+            self._messages.addMessage("\n".join(self._lines))
+            self._lines.clear()
 
 class CreateACSFromProfileDirect(object):
     """Step 2 Alternative: Create ACS files by calling API directly"""
     
+    # Bucket selection -> (bucket name, connection name suffix appended to the prefix)
+    _BUCKETS = {
+        "NASA Disasters (nasa-disasters)": (("nasa-disasters", None),),
+        "VEDA Production (veda-data-store)": (("veda-data-store", "prod"),),
+        "VEDA Development (veda-data-store-dev)": (("veda-data-store-dev", "dev"),),
+        "VEDA Staging (veda-data-store-staging)": (("veda-data-store-staging", "staging"),),
+        "All VEDA Buckets": (
+            ("veda-data-store", "prod"),
+            ("veda-data-store-dev", "dev"),
+            ("veda-data-store-staging", "staging")
+        )
+    }
+    
     def __init__(self):
         self.label = "Step 2 Direct: Create ACS (Direct API)"
         self.description = """Creates AWS S3 connection files (.acs) by calling the API directly.
@@ -97,17 +227,103 @@ class CreateACSFromProfileDirect(object):
         # Try to read config from profile
         profile_name = parameters[0].value
         if profile_name:
-            config_path = os.path.join(os.path.expanduser("~"), ".aws", f"{profile_name}_config.json")
-            if os.path.exists(config_path):
+            config = _profile_config(profile_name)
+            if config and 'region' in config:
+                parameters[5].value = config['region']
+
+    def _acs_with_token(self, method, log, output_folder, conn_name, bucket_name, access_key, secret_key, session_token, aws_region):
+        """Create one ACS file carrying the session token using the given method (1-3)"""
+        if method == 1:
+            log.append("Including session token...")
+            # Method 1: Try with the config_options provider options (name value pairs)
+            arcpy.management.CreateCloudStorageConnectionFile(
+                output_folder,
+                conn_name,
+                "AMAZON",
+                bucket_name,
+                access_key,
+                secret_key,
+                aws_region,
+                config_options=f"AWS_SESSION_TOKEN {session_token}"
+            )
+            log.append("[+] Created with session token (method 1)")
+        elif method == 2:
+            # Method 2: Try embedding in secret key (some versions)
+            log.append("Trying alternate session token method...")
+            combined_secret = f"{secret_key}:{session_token}"
+            arcpy.management.CreateCloudStorageConnectionFile(
+                output_folder,
+                conn_name,
+                "AMAZON",
+                bucket_name,
+                access_key,
+                combined_secret,
+                aws_region
+            )
+            log.append("[+] Created with session token (method 2)")
+        else:
+            # Method 3: Create ACS file manually
+            log.append("Creating ACS file manually with session token...")
+            acs_content = {
+                "cloudName": "AMAZON",
+                "connectionProperties": {
+                    "bucketName": bucket_name,
+                    "region": aws_region,
+                    "accessKeyId": access_key,
+                    "secretAccessKey": secret_key,
+                    "sessionToken": session_token
+                },
+                "name": conn_name
+            }
+            
+            acs_path = os.path.join(output_folder, f"{conn_name}.acs")
+            _write_acs(acs_path, _dumps(acs_content))
+            log.append("[+] Created manual ACS file with session token")
+
+    def _create_acs(self, log, output_folder, conn_name, bucket_name, access_key, secret_key, session_token, aws_region):
+        """Create one ACS file, falling back through the session token methods; progress goes to log"""
+        global _acs_method
+        # Note: Session tokens require special handling in ArcGIS Pro
+        if session_token:
+            # Start with the method that worked last time so known-failing ones are skipped
+            methods = [1, 2, 3]
+            if _acs_method:
+                methods.remove(_acs_method)
+                methods.insert(0, _acs_method)
+            for method in methods:
                 try:
-                    with open(config_path, 'r') as f:
-                        config = json.load(f)
-                        if 'region' in config:
-                            parameters[5].value = config['region']
-                except:
-                    pass
+                    self._acs_with_token(method, log, output_folder, conn_name, bucket_name,
+                                         access_key, secret_key, session_token, aws_region)
+                    _acs_method = method
+                    break
+                except (arcpy.ExecuteError, RuntimeError, TypeError, OSError) as e:
+                    # Geoprocessing failures, keywords this arcpy doesn't accept, and file
+                    # errors for method 3 all move to the next method
+                    log.append(f"[-] Method {method} failed: {str(e)}")
+                    if method == methods[-1]:
+                        raise
+        else:
+            arcpy.management.CreateCloudStorageConnectionFile(
+                output_folder,
+                conn_name,
+                "AMAZON",
+                bucket_name,
+                access_key,
+                secret_key,
+                aws_region
+            )
+            log.append("[+] Created without session token")
+        return os.path.join(output_folder, f"{conn_name}.acs")
 
     def execute(self, parameters, messages):
+        # One ArcGIS message per phase (credentials, then each ACS file)
+        buffered = _MessageBuffer(messages)
+        try:
+            self._execute(parameters, buffered)
+        finally:
+            buffered.flush()
+
+    def _execute(self, parameters, messages):
         profile_name = parameters[0].valueAsText
         bucket_selection = parameters[1].valueAsText
         custom_bucket = parameters[2].valueAsText
@@ -120,26 +336,20 @@ class CreateACSFromProfileDirect(object):
         messages.addMessage(f"Region: {aws_region}")
         
         # Read config file to get API details
-        config_path = os.path.join(os.path.expanduser("~"), ".aws", f"{profile_name}_config.json")
+        config_path = os.path.join(_HOME, ".aws", f"{profile_name}_config.json")
         if not os.path.exists(config_path):
             # Try to extract from the script file
-            script_path = os.path.join(os.path.expanduser("~"), ".aws", f"get_temp_creds_{profile_name}.py")
+            script_path = os.path.join(_HOME, ".aws", f"get_temp_creds_{profile_name}.py")
             if os.path.exists(script_path):
                 messages.addMessage(f"\nReading API details from script: {script_path}")
-                with open(script_path, 'r') as f:
-                    script_content = f.read()
-                    # Extract API URL and key
-                    import re
-                    url_match = re.search(r'API_URL\s*=\s*["\']([^"\']+)["\']', script_content)
-                    key_match = re.search(r'API_KEY\s*=\s*["\']([^"\']+)["\']', script_content)
-                    
-                    if url_match and key_match:
-                        api_url = url_match.group(1)
-                        api_key = key_match.group(1)
-                        messages.addMessage("Extracted API details from script")
-                    else:
-                        messages.addErrorMessage("Could not extract API details from script")
-                        return
+                # Extract API URL and key
+                api_url, api_key = _extract_api(script_path, os.stat(script_path).st_mtime_ns)
+                
+                if api_url and api_key:
+                    messages.addMessage("Extracted API details from script")
+                else:
+                    messages.addErrorMessage("Could not extract API details from script")
+                    return
             else:
                 messages.addErrorMessage(f"Config file not found: {config_path}")
                 messages.addMessage("Please run Step 1 first")
@@ -147,28 +357,25 @@ class CreateACSFromProfileDirect(object):
         else:
             # Read from config
             try:
-                with open(config_path, 'r') as f:
-                    config = json.load(f)
+                with open(config_path, 'rb') as f:
+                    config = _loads(f.read())
                     
-                # Try to get full API key from script
-                script_path = config.get('script_path', f"~/.aws/get_temp_creds_{profile_name}.py")
-                script_path = os.path.expanduser(script_path)
-                
-                if os.path.exists(script_path):
-                    with open(script_path, 'r') as f:
-                        script_content = f.read()
-                        import re
-                        url_match = re.search(r'API_URL\s*=\s*["\']([^"\']+)["\']', script_content)
-                        key_match = re.search(r'API_KEY\s*=\s*["\']([^"\']+)["\']', script_content)
-                        if url_match and key_match:
-                            api_url = url_match.group(1)
-                            api_key = key_match.group(1)
-                        else:
+                # Step 1 stores the full API details in the config; older configs only
+                # hold a truncated key, so fall back to scanning the script for those
+                api_url = config.get('api_url')
+                api_key = config.get('api_key')
+                if not (api_url and api_key) or api_key.endswith("..."):
+                    script_path = config.get('script_path', f"~/.aws/get_temp_creds_{profile_name}.py")
+                    script_path = _expanduser(script_path)
+                    
+                    if os.path.exists(script_path):
+                        api_url, api_key = _extract_api(script_path, os.stat(script_path).st_mtime_ns)
+                        if not (api_url and api_key):
                             messages.addErrorMessage("Could not extract API details")
                             return
-                else:
-                    messages.addErrorMessage("Script file not found")
-                    return
+                    else:
+                        messages.addErrorMessage("Script file not found")
+                        return
             except Exception as e:
                 messages.addErrorMessage(f"Error reading config: {str(e)}")
                 return
@@ -180,15 +387,13 @@ class CreateACSFromProfileDirect(object):
         try:
             # Use the correct header
             headers = {"api-key": api_key}
-            response = requests.get(api_url, headers=headers, timeout=30)
+            response, creds = _fetch_credentials(api_url, headers)
             
-            if response.status_code != 200:
+            if creds is None:
                 messages.addErrorMessage(f"API request failed: {response.status_code}")
                 messages.addMessage(f"Response: {response.text}")
                 return
                 
-            # Parse credentials
-            creds = response.json()
             
             access_key = creds.get('AccessKeyId')
             secret_key = creds.get('SecretAccessKey')
@@ -201,103 +406,42 @@ class CreateACSFromProfileDirect(object):
                 
             messages.addMessage("[+] Retrieved temporary credentials")
             messages.addMessage(f"Expires: {expiration}")
+            messages.flush()
             
             # Determine buckets to create
-            bucket_map = {
-                "NASA Disasters (nasa-disasters)": [("nasa-disasters", connection_prefix)],
-                "VEDA Production (veda-data-store)": [("veda-data-store", f"{connection_prefix}-prod")],
-                "VEDA Development (veda-data-store-dev)": [("veda-data-store-dev", f"{connection_prefix}-dev")],
-                "VEDA Staging (veda-data-store-staging)": [("veda-data-store-staging", f"{connection_prefix}-staging")],
-                "All VEDA Buckets": [
-                    ("veda-data-store", f"{connection_prefix}-prod"),
-                    ("veda-data-store-dev", f"{connection_prefix}-dev"),
-                    ("veda-data-store-staging", f"{connection_prefix}-staging")
-                ],
-                "Custom": [(custom_bucket, f"{connection_prefix}-custom")] if custom_bucket else []
-            }
-            
-            buckets = bucket_map.get(bucket_selection, [])
+            buckets = [
+                (bucket_name, f"{connection_prefix}-{suffix}" if suffix else connection_prefix)
+                for bucket_name, suffix in self._BUCKETS.get(bucket_selection, ())
+            ]
+            if bucket_selection == "Custom" and custom_bucket:
+                buckets = [(custom_bucket, f"{connection_prefix}-custom")]
             
             # Create ACS files
             messages.addMessage(f"\nCreating {len(buckets)} ACS file(s)...")
             created = 0
             
+            # Geoprocessing tools aren't thread-safe, so the files are created one at a
+            # time; keeping this on one thread also keeps the _acs_method update ordered
             for bucket_name, conn_name in buckets:
+                messages.addMessage(f"\nCreating connection for: {bucket_name}")
+                log = []
+                acs_path, error = None, None
                 try:
-                    messages.addMessage(f"\nCreating connection for: {bucket_name}")
-                    
-                    # Create the ACS file
-                    # Note: Session tokens require special handling in ArcGIS Pro
-                    if session_token:
-                        try:
-                            messages.addMessage("Including session token...")
-                            # Method 1: Try with additional_options parameter
-                            arcpy.management.CreateCloudStorageConnectionFile(
-                                output_folder,
-                                conn_name,
-                                "AMAZON",
-                                bucket_name,
-                                access_key,
-                                secret_key,
-                                aws_region,
-                                additional_options=f"AWS_SESSION_TOKEN={session_token}"
-                            )
-                            messages.addMessage("[+] Created with session token (method 1)")
-                        except:
-                            try:
-                                # Method 2: Try embedding in secret key (some versions)
-                                messages.addMessage("Trying alternate session token method...")
-                                combined_secret = f"{secret_key}:{session_token}"
-                                arcpy.management.CreateCloudStorageConnectionFile(
-                                    output_folder,
-                                    conn_name,
-                                    "AMAZON",
-                                    bucket_name,
-                                    access_key,
-                                    combined_secret,
-                                    aws_region
-                                )
-                                messages.addMessage("[+] Created with session token (method 2)")
-                            except:
-                                # Method 3: Create ACS file manually
-                                messages.addMessage("Creating ACS file manually with session token...")
-                                acs_content = {
-                                    "cloudName": "AMAZON",
-                                    "connectionProperties": {
-                                        "bucketName": bucket_name,
-                                        "region": aws_region,
-                                        "accessKeyId": access_key,
-                                        "secretAccessKey": secret_key,
-                                        "sessionToken": session_token
-                                    },
-                                    "name": conn_name
-                                }
-                                
-                                acs_path = os.path.join(output_folder, f"{conn_name}.acs")
-                                with open(acs_path, 'w') as f:
-                                    json.dump(acs_content, f)
-                                messages.addMessage("[+] Created manual ACS file with session token")
-                    else:
-                        arcpy.management.CreateCloudStorageConnectionFile(
-                            output_folder,
-                            conn_name,
-                            "AMAZON",
-                            bucket_name,
-                            access_key,
-                            secret_key,
-                            aws_region
-                        )
-                        messages.addMessage("[+] Created without session token")
-                    
-                    acs_path = os.path.join(output_folder, f"{conn_name}.acs")
+                    acs_path = self._create_acs(log, output_folder, conn_name, bucket_name,
+                                                access_key, secret_key, session_token, aws_region)
+                except Exception as e:
+                    error = e
+                for line in log:
+                    messages.addMessage(line)
+                if error:
+                    messages.addErrorMessage(f"Failed for {bucket_name}: {str(error)}")
+                else:
                     messages.addMessage(f"[+] Created: {acs_path}")
                     created += 1
-                    
-                except Exception as e:
-                    messages.addErrorMessage(f"Failed for {bucket_name}: {str(e)}")
             
             messages.addMessage(f"\n{'='*50}")
             messages.addMessage(f"Successfully created {created} connection(s)")
+            _cfg_cache.pop(profile_name, None)
             if expiration != 'Unknown':
                 messages.addMessage(f"\nIMPORTANT: Credentials expire at {expiration}")
                 messages.addMessage("You will need to recreate the ACS files before then")
@@ -3,6 +3,91 @@ import os
 import json
 import base64
 import requests
+from contextlib import contextmanager
+from pathlib import Path
+from requests.adapters import HTTPAdapter, Retry
+
+# Shared keep-alive session so repeated runs reuse the TLS connection to the API
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                                       max_retries=Retry(total=2, backoff_factor=0.2,
+                                                         status_forcelist=[429, 500, 502, 503, 504],
+                                                         raise_on_status=False)))
+
+# orjson when available: parses bytes and serializes straight to bytes
+try:
+    import orjson
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+# Only these fields of the credential API response are used
+_CRED_FIELDS = ('AccessKeyId', 'SecretAccessKey', 'SessionToken', 'Expiration')
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+def _fetch_credentials(api_url, headers):
+    """GETs the credential API; returns (response, creds) keeping only _CRED_FIELDS (None unless 200)"""
+    with _SESSION.get(api_url, headers=headers, timeout=(3.05, 27), stream=True) as response:  # (connect, read)
+        if response.status_code != 200:
+            response.content  # load the body before the connection goes back to the pool
+            return response, None
+        creds = {}
+        if ijson is not None:
+            # Incremental parse straight off the socket; other fields are never materialized.
+            # Read to the end so the connection can return to the keep-alive pool.
+            response.raw.decode_content = True
+            for key, value in ijson.kvitems(response.raw, ''):
+                if key in _CRED_FIELDS:
+                    creds[key] = value
+        else:
+            parsed = _loads(response.content)
+            creds = {k: parsed[k] for k in _CRED_FIELDS if k in parsed}
+    return response, creds
+
+@contextmanager
+def _env(key, value):
+    """Temporarily sets an environment variable, restoring the prior state even on error"""
+    old = os.environ.get(key)
+    os.environ[key] = value
+    try:
+        yield
+    finally:
+        if old is None:
+            os.environ.pop(key, None)
+        else:
+            os.environ[key] = old
+
+def _write_acs(path, data):
+    """Writes the serialized ACS bytes in one call"""
+    Path(path).write_bytes(data)
+
+class _MessageBuffer(object):
+    """Collects addMessage lines and hands them to ArcGIS as a single message per flush"""
+    
+    def __init__(self, messages):
+        self._messages = messages
+        self._lines = []
+    
+    def addMessage(self, text):
+        self._lines.append(text)
+    
+    def addErrorMessage(self, text):
+        # Keep ordering: pending lines go out before the error
+        self.flush()
+        self._messages.addErrorMessage(text)
+    
+    def flush(self):
+        if self._lines:
+            self._messages.addMessage("\n".join(self._lines))
+            self._lines.clear()
 
 class CreateACSWithSessionToken(object):
     """Create ACS files with proper session token support"""
@@ -83,15 +168,34 @@ class CreateACSWithSessionToken(object):
         param5.value = "us-west-2"
         params.append(param5)
         
+        # Optional connection test (an S3 round trip through the cloud store driver)
+        param6 = arcpy.Parameter(
+            displayName="Test Connection",
+            name="test_connection",
+            datatype="GPBoolean",
+            parameterType="Optional",
+            direction="Input")
+        param6.value = False
+        params.append(param6)
+        
         return params
 
     def execute(self, parameters, messages):
+        # Batch messages so each phase is a single ArcGIS message
+        buffered = _MessageBuffer(messages)
+        try:
+            self._execute(parameters, buffered)
+        finally:
+            buffered.flush()
+
+    def _execute(self, parameters, messages):
         api_url = parameters[0].valueAsText
         api_key = parameters[1].valueAsText
         bucket = parameters[2].valueAsText
         conn_name = parameters[3].valueAsText
         output_folder = parameters[4].valueAsText
         region = parameters[5].valueAsText
+        test_connection = bool(parameters[6].value)
         
         messages.addMessage("=== Creating ACS with Session Token Support ===")
         
@@ -99,13 +203,12 @@ class CreateACSWithSessionToken(object):
         messages.addMessage(f"Fetching credentials from API...")
         try:
             headers = {"api-key": api_key}
-            response = requests.get(api_url, headers=headers, timeout=30)
+            response, creds = _fetch_credentials(api_url, headers)
             
-            if response.status_code != 200:
+            if creds is None:
                 messages.addErrorMessage(f"API request failed: {response.status_code}")
                 return
                 
-            creds = response.json()
             access_key = creds.get('AccessKeyId')
             secret_key = creds.get('SecretAccessKey')
             session_token = creds.get('SessionToken')
@@ -120,6 +223,7 @@ class CreateACSWithSessionToken(object):
                 
             messages.addMessage("[+] Retrieved temporary credentials with session token")
             messages.addMessage(f"Expires: {expiration}")
+            messages.flush()
             
             # Method 1: Try standard ArcGIS method with environment variable
             acs_path = os.path.join(output_folder, f"{conn_name}.acs")
@@ -127,48 +231,42 @@ class CreateACSWithSessionToken(object):
             try:
                 messages.addMessage("\nMethod 1: Using environment variable for session token...")
                 
-                # Set environment variable for session token
-                os.environ['AWS_SESSION_TOKEN'] = session_token
-                
-                # Create connection with environment variable set
-                arcpy.management.CreateCloudStorageConnectionFile(
-                    output_folder,
-                    conn_name,
-                    "AMAZON",
-                    bucket,
-                    access_key,
-                    secret_key,
-                    region
-                )
-                
-                # Clear environment variable
-                del os.environ['AWS_SESSION_TOKEN']
+                # Create connection with the session token in the environment (always restored)
+                with _env('AWS_SESSION_TOKEN', session_token):
+                    arcpy.management.CreateCloudStorageConnectionFile(
+                        output_folder,
+                        conn_name,
+                        "AMAZON",
+                        bucket,
+                        access_key,
+                        secret_key,
+                        region
+                    )
                 
                 messages.addMessage("[+] Created ACS file with environment variable method")
                 
-            except Exception as e1:
+            except (arcpy.ExecuteError, RuntimeError) as e1:
                 messages.addMessage(f"[-] Method 1 failed: {str(e1)}")
                 
                 # Method 2: Create ACS file manually
                 messages.addMessage("\nMethod 2: Creating ACS file manually...")
                 
                 try:
-                    # ArcGIS Pro ACS file format
-                    acs_content = f"""{{
-    "version": "1.0",
-    "type": "cloudStore",
-    "cloudStoreType": "amazon",
-    "connectionString": "REGION={region};BUCKET={bucket};ACCESS_KEY_ID={access_key};SECRET_ACCESS_KEY={secret_key};SESSION_TOKEN={session_token}",
-    "friendlyName": "{conn_name}",
-    "nodeId": "/"
-}}"""
+                    # ArcGIS Pro ACS file format (serializer escapes any quotes/backslashes in the secrets)
+                    acs_content = _dumps({
+                        "version": "1.0",
+                        "type": "cloudStore",
+                        "cloudStoreType": "amazon",
+                        "connectionString": f"REGION={region};BUCKET={bucket};ACCESS_KEY_ID={access_key};SECRET_ACCESS_KEY={secret_key};SESSION_TOKEN={session_token}",
+                        "friendlyName": conn_name,
+                        "nodeId": "/"
+                    })
                     
-                    with open(acs_path, 'w', encoding='utf-8') as f:
-                        f.write(acs_content)
+                    _write_acs(acs_path, acs_content)
                     
                     messages.addMessage("[+] Created manual ACS file format 1")
                     
-                except Exception as e2:
+                except (OSError, TypeError, ValueError) as e2:
                     messages.addMessage(f"[-] Method 2 failed: {str(e2)}")
                     
                     # Method 3: Alternative ACS format
@@ -191,12 +289,11 @@ class CreateACSWithSessionToken(object):
                             "name": conn_name
                         }
                         
-                        with open(acs_path, 'w', encoding='utf-8') as f:
-                            json.dump(acs_data, f, indent=2)
+                        _write_acs(acs_path, _dumps(acs_data))
                         
                         messages.addMessage("[+] Created manual ACS file format 2")
                         
-                    except Exception as e3:
+                    except (OSError, TypeError, ValueError) as e3:
                         messages.addMessage(f"[-] Method 3 failed: {str(e3)}")
             
             # Verify file was created
@@ -204,18 +301,19 @@ class CreateACSWithSessionToken(object):
                 messages.addMessage(f"\n[+] ACS file created: {acs_path}")
                 messages.addMessage(f"Size: {os.path.getsize(acs_path)} bytes")
                 
-                # Test the connection
-                messages.addMessage("\nTesting connection...")
-                test_key = "test-file.txt"  # A simple test
-                test_path = acs_path + "\\" + test_key
-                
-                try:
-                    if arcpy.Exists(test_path):
-                        messages.addMessage("[+] Connection test passed - can list objects")
-                    else:
-                        messages.addMessage("[?] Connection created but couldn't verify access")
-                except:
-                    messages.addMessage("[?] Connection created but test inconclusive")
+                # Test the connection only when asked: it costs an S3 round trip
+                if test_connection:
+                    messages.addMessage("\nTesting connection...")
+                    test_key = "test-file.txt"  # A simple test
+                    test_path = acs_path + "\\" + test_key
+                    
+                    try:
+                        if arcpy.Exists(test_path):
+                            messages.addMessage("[+] Connection test passed - can list objects")
+                        else:
+                            messages.addMessage("[?] Connection created but couldn't verify access")
+                    except (arcpy.ExecuteError, RuntimeError, OSError) as e:
+                        messages.addMessage(f"[?] Connection created but test inconclusive: {str(e)}")
                     
                 messages.addMessage("\n" + "="*50)
                 messages.addMessage("ACS file created with session token support")
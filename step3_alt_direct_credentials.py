@@ -4,16 +4,480 @@ import requests
 import json
 import tempfile
 import shutil
+import hashlib
+import functools
+import threading
+import time
+from contextlib import contextmanager, ExitStack
+from urllib.parse import urlsplit
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter, Retry
+
+
+# orjson when available: parses bytes and serializes straight to bytes
+try:
+    import orjson
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+# One keep-alive pool shared by the credential, STAC and asset requests
+_SESSION = requests.Session()
+_SESSION.headers['Connection'] = 'keep-alive'
+_ADAPTER = HTTPAdapter(pool_connections=32, pool_maxsize=64,
+                       max_retries=Retry(total=3, backoff_factor=0.3,
+                                         status_forcelist=[429, 500, 502, 503, 504],
+                                         raise_on_status=False))
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+_TIMEOUT = (5, 30)
+
+
+_CRED_FILE = os.path.join(tempfile.gettempdir(), "veda_creds.json")
+_CRED_MARGIN = timedelta(minutes=5)
+
+
+def _key_digest(api_key):
+    """Fingerprint the API key so the cache file never stores it"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+def _expiry(creds):
+    """Parse the STS Expiration timestamp, or None if absent/unparseable"""
+    try:
+        expiry = datetime.fromisoformat(creds['Expiration'].replace('Z', '+00:00'))
+    except (KeyError, AttributeError, ValueError):
+        return None
+    return expiry if expiry.tzinfo else expiry.replace(tzinfo=timezone.utc)
+
+
+_STAC_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".veda_stac_cache")
+
+
+def _get_stac_items(items_url):
+    """GET a STAC items page, revalidating a disk cache with ETag/Last-Modified.
+    
+    Returns (data, note); data is None if neither network nor cache has it.
+    """
+    cache_file = os.path.join(_STAC_CACHE_DIR,
+                              hashlib.sha1(items_url.encode('utf-8')).hexdigest() + ".json")
+    try:
+        with open(cache_file, 'rb') as f:
+            cached = _loads(f.read())
+    except (OSError, ValueError):
+        cached = None
+    
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+    
+    try:
+        response = _SESSION.get(items_url, headers=headers, timeout=_TIMEOUT)
+    except requests.RequestException as e:
+        if cached:
+            return cached['data'], f"using cached items ({e.__class__.__name__})"
+        raise
+    
+    if response.status_code == 304 and cached:
+        return cached['data'], "not modified, using cached items"
+    if response.status_code >= 500 and cached:
+        return cached['data'], f"server returned {response.status_code}, using cached items"
+    if response.status_code != 200:
+        return None, f"status {response.status_code}"
+    
+    data = _loads(response.content)
+    if response.headers.get('ETag') or response.headers.get('Last-Modified'):
+        try:
+            os.makedirs(_STAC_CACHE_DIR, exist_ok=True)
+            with open(cache_file, 'wb') as f:
+                f.write(_dumps({"etag": response.headers.get('ETag'),
+                                "last_modified": response.headers.get('Last-Modified'),
+                                "data": data}))
+        except OSError:
+            pass
+    return data, None
+
+
+def _query_stac(items_url):
+    """Query only id and assets (STAC fields extension), else the full items"""
+    data, note = _get_stac_items(f"{items_url}&fields=id,assets")
+    if note == "status 400":
+        # Endpoint doesn't support the fields extension
+        data, note = _get_stac_items(items_url)
+    return data, note
+
+
+# Set while asset downloads may proceed; cleared while S3 is throttling us
+_UNTHROTTLED = threading.Event()
+_UNTHROTTLED.set()
+
+
+_THROTTLE_ATTEMPTS = 4
+
+
+def _get_asset(url, **kwargs):
+    """Streamed asset GET that pauses every download worker on 429/503, then retries"""
+    for attempt in range(_THROTTLE_ATTEMPTS):
+        _UNTHROTTLED.wait()
+        response = _SESSION.get(url, stream=True, timeout=_TIMEOUT, **kwargs)
+        if response.status_code not in (429, 503) or attempt == _THROTTLE_ATTEMPTS - 1:
+            return response
+        response.close()
+        try:
+            delay = float(response.headers.get('Retry-After', 1))
+        except ValueError:
+            delay = 1.0
+        _UNTHROTTLED.clear()
+        try:
+            time.sleep(min(delay * (attempt + 1), 30))
+        finally:
+            _UNTHROTTLED.set()
+
+
+def _iter_features(data, limit):
+    """Yield up to limit features from a STAC items page and its rel="next" pages.
+    
+    The next page is requested in the background while this one is consumed.
+    """
+    count = 0
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        while True:
+            features = data.get('features', [])[:limit - count]
+            count += len(features)
+            
+            pending = None
+            if features and count < limit:
+                next_url = next((link.get('href') for link in data.get('links', [])
+                                 if link.get('rel') == 'next'
+                                 and link.get('method', 'GET') == 'GET'), None)
+                if next_url:
+                    pending = executor.submit(_get_stac_items, next_url)
+            
+            yield from features
+            
+            if pending is None:
+                return
+            data, _ = pending.result()
+            if not data:
+                return
+
+
+_RANGE_PARTS = 8
+_RANGE_MIN_SIZE = 16 * 1024 * 1024
+
+
+def _fetch_range(url, local_file, lo, hi):
+    """Worker: write bytes lo..hi of url into local_file at the same offset.
+    
+    Returns False without writing unless the server answered 206 with that range.
+    """
+    with _get_asset(url, headers={'Range': f'bytes={lo}-{hi}',
+                                  'Accept-Encoding': 'identity'}) as response:
+        if response.status_code != 206:
+            return False
+        with open(local_file, 'r+b') as f:
+            f.seek(lo)
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+    return True
+
+
+def _download_https(bucket, key, local_file, log, size=None):
+    """Download an object over plain HTTPS, returning True on success.
+    
+    size is the object's Content-Length when an unsigned HEAD already read it.
+    """
+    # Unsigned, so this only works for public buckets; signed access goes
+    # through boto3's pre-signed URLs instead
+    https_url = f"https://{bucket}.s3.amazonaws.com/{key}"
+    log.append(f"  Trying HTTPS: {https_url}")
+    
+    # Large objects that support ranges are fetched as parallel byte ranges
+    ranges_ok = size is not None  # S3 serves ranges for every object
+    if size is None:
+        head = _SESSION.head(https_url, timeout=_TIMEOUT)
+        size = int(head.headers.get('Content-Length', 0)) if head.status_code == 200 else 0
+        ranges_ok = head.headers.get('Accept-Ranges') == 'bytes'
+    if size >= _RANGE_MIN_SIZE and ranges_ok:
+        with open(local_file, 'wb') as f:
+            f.truncate(size)
+        
+        step = -(-size // _RANGE_PARTS)
+        ranges = [(lo, min(lo + step, size) - 1) for lo in range(0, size, step)]
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [executor.submit(_fetch_range, https_url, local_file, lo, hi)
+                       for lo, hi in ranges]
+            ranged = all([future.result() for future in futures])
+        if ranged:
+            log.append(f"  [+] Downloaded via HTTPS ({len(ranges)} byte ranges)")
+            return True
+        # A 200 for the whole object would overlap at every offset; use one GET
+        log.append("  [-] Server ignored byte ranges, downloading as a single request")
+    
+    # Rasters are already compressed, so ask for the bytes as stored
+    with _get_asset(https_url, headers={'Accept-Encoding': 'identity'}) as response:
+        if response.status_code != 200:
+            log.append(f"  [-] HTTPS failed: {response.status_code}")
+            log.append("  The bucket might require signed requests")
+            return False
+        
+        with open(local_file, 'wb') as f:
+            response.raw.decode_content = True
+            shutil.copyfileobj(response.raw, f, length=1024 * 1024)
+    log.append("  [+] Downloaded via HTTPS")
+    return True
+
+
+_PRESIGNED_MAX_SIZE = 32 * 1024 * 1024
+
+
+def _download_presigned(s3, bucket, key, local_file, log, size=0):
+    """Fetch a small object through a pre-signed URL on the pooled session.
+    
+    Returns True when downloaded, or False when the object is large enough
+    that s3transfer's multipart download should handle it instead. A size
+    already known from HEAD decides that before any GET is opened.
+    """
+    if size > _PRESIGNED_MAX_SIZE:
+        return False
+    url = s3.generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': key},
+                                    ExpiresIn=900)
+    with _get_asset(url, headers={'Accept-Encoding': 'identity'}) as response:
+        response.raise_for_status()
+        if int(response.headers.get('Content-Length', 0)) > _PRESIGNED_MAX_SIZE:
+            return False
+        response.raw.decode_content = True
+        with open(local_file, 'wb') as f:
+            shutil.copyfileobj(response.raw, f, length=1024 * 1024)
+    log.append("  [+] Downloaded via pre-signed URL")
+    return True
+
+
+def _fetch(s3, transfer, bucket, key, local_file, log, size=0):
+    """Download one object to local_file, returning True on success; size is from HEAD, 0 if unknown"""
+    if s3 is not None:
+        try:
+            if _download_presigned(s3, bucket, key, local_file, log, size):
+                return True
+            s3.download_file(bucket, key, local_file, Config=transfer)
+            log.append("  [+] Downloaded with boto3")
+            return True
+        except Exception as e:
+            log.append(f"  [-] boto3 failed: {str(e)}")
+    
+    try:
+        # Without boto3, _head already made the same unsigned HEAD
+        return _download_https(bucket, key, local_file, log, size if s3 is None and size else None)
+    except Exception as e:
+        log.append(f"  [-] HTTP method failed: {str(e)}")
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def _boto3():
+    """Import boto3 on first use so HTTPS-only runs never load it; None if missing"""
+    try:
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+    except ImportError:
+        return None
+    return boto3, TransferConfig, Config
+
+
+def _s3_client(access_key, secret_key, session_token):
+    """Build the shared S3 client and TransferConfig, or (None, None) without boto3"""
+    modules = _boto3()
+    if modules is None:
+        return None, None
+    boto3, TransferConfig, Config = modules
+    
+    session = boto3.Session(
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        aws_session_token=session_token,
+        region_name='us-west-2'
+    )
+    client_config = Config(
+        signature_version='s3v4',
+        s3={'addressing_style': 'virtual'},
+        max_pool_connections=32,
+        tcp_keepalive=True,
+        retries={'max_attempts': 5, 'mode': 'adaptive'})
+    try:
+        # botocore >= 1.36 checksums every GET by default; skip it
+        client_config = client_config.merge(Config(
+            response_checksum_validation='when_required',
+            request_checksum_calculation='when_required'))
+    except TypeError:
+        pass
+    transfer = TransferConfig(multipart_threshold=16 * 1024 * 1024,
+                              multipart_chunksize=16 * 1024 * 1024,
+                              max_concurrency=16,
+                              max_io_queue=1000,
+                              io_chunksize=2 * 1024 * 1024,
+                              use_threads=True)
+    return session.client('s3', config=client_config), transfer
+
+
+_ASSET_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".veda_asset_cache")
+_ASSET_CACHE_MAX = 10 * 1024 ** 3
+
+
+def _head(s3, bucket, key):
+    """Return (etag, size) for an object, or (None, 0) if it can't be read"""
+    if s3 is not None:
+        url = s3.generate_presigned_url('head_object', Params={'Bucket': bucket, 'Key': key},
+                                        ExpiresIn=900)
+    else:
+        url = f"https://{bucket}.s3.amazonaws.com/{key}"
+    head = _SESSION.head(url, timeout=_TIMEOUT)
+    if head.status_code != 200:
+        return None, 0
+    return head.headers.get('ETag', '').strip('"') or None, int(head.headers.get('Content-Length', 0))
+
+
+def _download(s3, transfer, bucket, key, asset_dir, filename):
+    """Worker: fetch one asset into the cache, returning (path or None, log lines)"""
+    log = []
+    try:
+        return _download_to_cache(s3, transfer, bucket, key, asset_dir, filename, log), log
+    except Exception as e:
+        # One failed asset must not cost the rest of the batch
+        log.append(f"  [-] Download error: {str(e)}")
+        return None, log
+
+
+def _download_to_cache(s3, transfer, bucket, key, asset_dir, filename, log):
+    try:
+        etag, size = _head(s3, bucket, key)
+    except requests.RequestException:
+        etag, size = None, 0
+    
+    # Content-addressed by ETag, so a changed object never hits a stale copy
+    local_file = os.path.join(asset_dir, etag or "unversioned", filename)
+    if etag and os.path.isfile(local_file) and os.path.getsize(local_file) == size:
+        os.utime(local_file)
+        log.append(f"  [+] Using cached copy: {local_file}")
+        return local_file
+    
+    os.makedirs(os.path.dirname(local_file), exist_ok=True)
+    part_file = local_file + ".part"
+    if not _fetch(s3, transfer, bucket, key, part_file, log, size):
+        return None
+    os.replace(part_file, local_file)
+    log.append(f"  Saved to: {local_file}")
+    return local_file
+
+
+def _evict_asset_cache(keep):
+    """Delete least recently used cache files until the cache fits its size cap"""
+    entries = []
+    for root, _, files in os.walk(_ASSET_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_atime, st.st_size, path))
+    
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= _ASSET_CACHE_MAX:
+            break
+        if path in keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+@contextmanager
+def _env(key, value):
+    """Set key=value for the duration of the with block"""
+    old = os.environ.get(key)
+    os.environ[key] = value
+    try:
+        yield
+    finally:
+        if old is None:
+            os.environ.pop(key, None)
+        else:
+            os.environ[key] = old
+
+class _MessageBuffer(object):
+    """Collects addMessage lines and hands them to ArcGIS as a single message per flush"""
+    
+    def __init__(self, messages):
+        self._messages = messages
+        self._lines = []
+    
+    def addMessage(self, text):
+        self._lines.append(text)
+    
+    def addErrorMessage(self, text):
+        # Keep ordering: pending lines go out before the error
+        self.flush()
+        self._messages.addErrorMessage(text)
+    
+    def flush(self):
+        if self._lines:
+            self._messages.addMessage("\n".join(self._lines))
+            self._lines.clear()
 
 class BrowseAndRenderSTACDirect(object):
     """Step 3 Alternative: Browse and Render STAC using direct credential access"""
     
+    # cred_api_url -> {"key": api key digest, "creds": STS credentials}
+    _cred_cache = None
+    
     def __init__(self):
         self.label = "Step 3 Alt: Browse STAC (Direct Credentials)"
         self.description = """Browse STAC and render using temporary credentials directly.
         
         This bypasses ACS files and downloads data using credentials directly."""
-        self.canRunInBackground = False
+        self.canRunInBackground = True
+        
+        if BrowseAndRenderSTACDirect._cred_cache is None:
+            try:
+                with open(_CRED_FILE) as f:
+                    BrowseAndRenderSTACDirect._cred_cache = json.load(f)
+            except (OSError, ValueError):
+                BrowseAndRenderSTACDirect._cred_cache = {}
+
+    def _cached_credentials(self, cred_api_url, cred_api_key):
+        """Return cached credentials still valid for 5+ minutes, else None"""
+        entry = self._cred_cache.get(cred_api_url)
+        if not entry or entry.get('key') != _key_digest(cred_api_key):
+            return None
+        expiry = _expiry(entry['creds'])
+        if expiry is None or expiry - datetime.now(timezone.utc) <= _CRED_MARGIN:
+            return None
+        return entry['creds']
+
+    def _store_credentials(self, cred_api_url, cred_api_key, creds):
+        """Cache credentials in memory and in a user-only file in the temp dir"""
+        if _expiry(creds) is None:
+            return
+        self._cred_cache[cred_api_url] = {"key": _key_digest(cred_api_key), "creds": creds}
+        try:
+            fd = os.open(_CRED_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._cred_cache, f)
+            os.chmod(_CRED_FILE, 0o600)
+        except OSError:
+            pass
 
     def getParameterInfo(self):
         params = []
@@ -79,13 +543,21 @@ class BrowseAndRenderSTACDirect(object):
             parameterType="Required",
             direction="Input")
         param5.filter.type = "ValueList"
-        param5.filter.list = ["boto3 (S3 API)", "HTTP Pre-signed URLs"]
+        param5.filter.list = ["boto3 (S3 API)", "HTTP Pre-signed URLs", "Lazy (vsis3)"]
         param5.value = "boto3 (S3 API)"
         params.append(param5)
         
         return params
 
     def execute(self, parameters, messages):
+        # Batch messages; the progressor covers the download phase
+        buffered = _MessageBuffer(messages)
+        try:
+            self._execute(parameters, buffered)
+        finally:
+            buffered.flush()
+
+    def _execute(self, parameters, messages):
         cred_api_url = parameters[0].valueAsText
         cred_api_key = parameters[1].valueAsText
         stac_url = parameters[2].valueAsText
@@ -96,16 +568,28 @@ class BrowseAndRenderSTACDirect(object):
         messages.addMessage("=== Direct Credential STAC Access ===")
         
         try:
-            # Get credentials
-            messages.addMessage("Fetching temporary credentials...")
-            headers = {"api-key": cred_api_key}
-            response = requests.get(cred_api_url, headers=headers, timeout=30)
+            # Start the STAC query now; it doesn't depend on the credentials
+            items_url = f"{stac_url}/collections/{collection}/items?limit={limit}"
+            executor = ThreadPoolExecutor(max_workers=1)
+            stac_future = executor.submit(_query_stac, items_url)
+            executor.shutdown(wait=False)
             
-            if response.status_code != 200:
-                messages.addErrorMessage(f"Failed to get credentials: {response.status_code}")
-                return
+            # Get credentials, reusing cached ones until close to expiry
+            creds = self._cached_credentials(cred_api_url, cred_api_key)
+            if creds:
+                messages.addMessage("Using cached temporary credentials")
+            else:
+                messages.addMessage("Fetching temporary credentials...")
+                headers = {"api-key": cred_api_key}
+                response = _SESSION.get(cred_api_url, headers=headers, timeout=_TIMEOUT)
                 
-            creds = response.json()
+                if response.status_code != 200:
+                    messages.addErrorMessage(f"Failed to get credentials: {response.status_code}")
+                    return
+                    
+                creds = _loads(response.content)
+                self._store_credentials(cred_api_url, cred_api_key, creds)
+            
             access_key = creds.get('AccessKeyId')
             secret_key = creds.get('SecretAccessKey')
             session_token = creds.get('SessionToken')
@@ -114,120 +598,141 @@ class BrowseAndRenderSTACDirect(object):
             
             # Query STAC
             messages.addMessage(f"\nQuerying STAC collection: {collection}")
-            items_url = f"{stac_url}/collections/{collection}/items?limit={limit}"
-            response = requests.get(items_url)
+            data, note = stac_future.result()
             
-            if response.status_code != 200:
-                messages.addErrorMessage("Failed to query STAC")
+            if data is None:
+                messages.addErrorMessage(f"Failed to query STAC: {note}")
                 return
+            if note:
+                messages.addMessage(f"  STAC {note}")
                 
-            data = response.json()
-            features = data.get('features', [])
-            messages.addMessage(f"Found {len(features)} items")
-            
-            if not features:
+            if not data.get('features'):
+                messages.addMessage("Found 0 items")
                 return
             
             # Process items
-            temp_dir = tempfile.mkdtemp()
-            messages.addMessage(f"\nTemp directory: {temp_dir}")
+            messages.addMessage(f"\nAsset cache: {_ASSET_CACHE_DIR}")
             
-            for feature in features:
+            # Collect every download first so they can run concurrently
+            tasks = []
+            lazy_paths = []
+            seen_hrefs = set()
+            item_count = 0
+            for feature in _iter_features(data, limit):
+                item_count += 1
+                if item_count % 20 == 0:
+                    messages.flush()
                 item_id = feature.get('id')
-                assets = feature.get('assets', {})
+                
+                # Only S3 image assets matter; the same object can appear
+                # under several items, so fetch each href once
+                image_assets = [(n, a) for n, a in feature.get('assets', {}).items()
+                                if a.get('href', '').startswith('s3://')
+                                and a.get('type', '').startswith('image/')
+                                and a['href'] not in seen_hrefs]
+                if not image_assets:
+                    continue
                 
                 messages.addMessage(f"\nProcessing: {item_id}")
                 
-                for asset_name, asset_info in assets.items():
-                    href = asset_info.get('href', '')
-                    if href.startswith('s3://') and asset_info.get('type', '').startswith('image/'):
-                        # Extract S3 details
-                        bucket = href.replace('s3://', '').split('/')[0]
-                        key = '/'.join(href.replace('s3://', '').split('/')[1:])
-                        
-                        messages.addMessage(f"  Asset: {asset_name}")
-                        messages.addMessage(f"  Bucket: {bucket}")
-                        messages.addMessage(f"  Key: {key}")
-                        
-                        if method == "boto3 (S3 API)":
-                            # Method 1: Use boto3
-                            try:
-                                import boto3
-                                from botocore.config import Config
-                                
-                                messages.addMessage("  Using boto3 to download...")
-                                
-                                # Create session with temporary credentials
-                                session = boto3.Session(
-                                    aws_access_key_id=access_key,
-                                    aws_secret_access_key=secret_key,
-                                    aws_session_token=session_token,
-                                    region_name='us-west-2'
-                                )
-                                
-                                s3 = session.client('s3', config=Config(signature_version='s3v4'))
-                                
-                                # Download file
-                                local_file = os.path.join(temp_dir, os.path.basename(key))
-                                s3.download_file(bucket, key, local_file)
-                                
-                                messages.addMessage(f"  [+] Downloaded to: {local_file}")
-                                
-                                # Add to map
-                                aprx = arcpy.mp.ArcGISProject("CURRENT")
-                                active_map = aprx.activeMap
-                                active_map.addDataFromPath(local_file)
-                                messages.addMessage("  [+] Added to map!")
-                                
-                            except ImportError:
-                                messages.addMessage("  [-] boto3 not installed, trying HTTP method...")
-                                method = "HTTP Pre-signed URLs"
-                            except Exception as e:
-                                messages.addMessage(f"  [-] boto3 failed: {str(e)}")
-                                method = "HTTP Pre-signed URLs"
-                        
-                        if method == "HTTP Pre-signed URLs":
-                            # Method 2: Generate pre-signed URL
-                            try:
-                                # Use requests-aws4auth or manual signing
-                                messages.addMessage("  Generating pre-signed URL...")
-                                
-                                # Manual v4 signature (simplified)
-                                import hmac
-                                import hashlib
-                                from datetime import datetime
-                                
-                                # This is a simplified version - full implementation would be longer
-                                # For now, try direct HTTPS access first
-                                https_url = f"https://{bucket}.s3.amazonaws.com/{key}"
-                                messages.addMessage(f"  Trying HTTPS: {https_url}")
-                                
-                                # Download file
-                                local_file = os.path.join(temp_dir, os.path.basename(key))
-                                response = requests.get(https_url, stream=True)
-                                
-                                if response.status_code == 200:
-                                    with open(local_file, 'wb') as f:
-                                        shutil.copyfileobj(response.raw, f)
-                                    
-                                    messages.addMessage(f"  [+] Downloaded via HTTPS")
-                                    
-                                    # Add to map
-                                    aprx = arcpy.mp.ArcGISProject("CURRENT")
-                                    active_map = aprx.activeMap
-                                    active_map.addDataFromPath(local_file)
-                                    messages.addMessage("  [+] Added to map!")
-                                else:
-                                    messages.addMessage(f"  [-] HTTPS failed: {response.status_code}")
-                                    messages.addMessage("  The bucket might require signed requests")
-                                    
-                            except Exception as e:
-                                messages.addMessage(f"  [-] HTTP method failed: {str(e)}")
+                for asset_name, asset_info in image_assets:
+                    href = asset_info['href']
+                    if href in seen_hrefs:
+                        continue
+                    seen_hrefs.add(href)
+                    
+                    # Extract S3 details
+                    parts = urlsplit(href)
+                    bucket, key = parts.netloc, parts.path.lstrip('/')
+                    
+                    messages.addMessage(f"  Asset: {asset_name}")
+                    messages.addMessage(f"  Bucket: {bucket}")
+                    messages.addMessage(f"  Key: {key}")
+                    
+                    # COGs can be read in place by GDAL with range requests
+                    if method == "Lazy (vsis3)" and 'cloud-optimized' in asset_info['type']:
+                        lazy_paths.append(f"/vsis3/{bucket}/{key}")
+                        continue
+                    
+                    # Everything but the ETag directory is known up front
+                    tasks.append((bucket, key,
+                                  os.path.join(_ASSET_CACHE_DIR, bucket, key.replace('/', '_')),
+                                  os.path.basename(key)))
+            
+            messages.addMessage(f"\nFound {item_count} items")
+            
+            if not tasks and not lazy_paths:
+                messages.addMessage("\nNo S3 image assets to download")
+                return
+            
+            s3, transfer = None, None
+            if tasks and method != "HTTP Pre-signed URLs":
+                # Method 1: one boto3 client shared by all download threads
+                s3, transfer = _s3_client(access_key, secret_key, session_token)
+                if s3 is None:
+                    messages.addMessage("[-] boto3 not installed, trying HTTP method...")
+            
+            results = []
+            if tasks:
+                messages.addMessage(f"\nDownloading {len(tasks)} asset(s)...")
+                messages.flush()
+                arcpy.SetProgressor("step", "Downloading assets...", 0, len(tasks), 1)
+                with ThreadPoolExecutor(max_workers=min(10, len(tasks))) as executor:
+                    futures = [executor.submit(_download, s3, transfer, *t) for t in tasks]
+                    for _ in as_completed(futures):
+                        arcpy.SetProgressorPosition()
+                    results = [future.result() for future in futures]
+                arcpy.ResetProgressor()
+            
+            layer_paths = []
+            for (bucket, key, _, _), (local_file, log) in zip(tasks, results):
+                messages.addMessage(f"\n{key}")
+                for line in log:
+                    messages.addMessage(line)
+                if local_file:
+                    layer_paths.append(local_file)
+            if tasks:
+                _evict_asset_cache(set(layer_paths))
+            
+            gdal_env = {}
+            if lazy_paths:
+                # GDAL picks up the temporary credentials from the environment,
+                # set only while the layers are opened and restored afterwards
+                gdal_env = {
+                    'AWS_ACCESS_KEY_ID': access_key,
+                    'AWS_SECRET_ACCESS_KEY': secret_key,
+                    'AWS_SESSION_TOKEN': session_token,
+                    'AWS_REGION': 'us-west-2',
+                    'CPL_VSIL_CURL_USE_HEAD': 'YES',
+                    'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR',
+                    'VSI_CACHE': 'TRUE',
+                    'VSI_CACHE_SIZE': '536870912',
+                }
+                messages.addMessage(f"\nOpening {len(lazy_paths)} COG(s) in place via /vsis3/")
+                layer_paths.extend(lazy_paths)
+            
+            # Add everything in one batch from the main thread (arcpy.mp is
+            # not thread-safe) so the project is opened only once
+            if layer_paths:
+                messages.addMessage(f"\nAdding {len(layer_paths)} layer(s) to the map...")
+                messages.flush()
+                aprx = arcpy.mp.ArcGISProject("CURRENT")
+                active_map = aprx.activeMap
+                with ExitStack() as env:
+                    for name, value in gdal_env.items():
+                        if value is not None:
+                            env.enter_context(_env(name, value))
+                    for path in layer_paths:
+                        try:
+                            active_map.addDataFromPath(path)
+                            messages.addMessage(f"  [+] Added to map: {os.path.basename(path)}")
+                        except Exception as e:
+                            messages.addMessage(f"  [-] Could not add {os.path.basename(path)}: {str(e)}")
             
             messages.addMessage(f"\n" + "="*50)
             messages.addMessage("Processing complete")
-            messages.addMessage(f"Temp files in: {temp_dir}")
-            messages.addMessage("Files will remain until you close ArcGIS Pro")
+            messages.addMessage(f"Cached files in: {_ASSET_CACHE_DIR}")
+            messages.addMessage("Unchanged assets are reused on the next run")
             
         except Exception as e:
             messages.addErrorMessage(f"Error: {str(e)}")
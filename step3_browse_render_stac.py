@@ -2,11 +2,239 @@ import arcpy
 import os
 import requests
 import json
+import re
+import tempfile
+import hashlib
+import time
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter, Retry
+
+# One keep-alive pool so collection pages and item queries share TLS sessions
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                                       max_retries=Retry(total=2, backoff_factor=0.2)))
+# urllib3 only decodes brotli when a brotli module is installed
+try:
+    import brotli
+    _SESSION.headers['Accept-Encoding'] = 'br, gzip, deflate'
+except ImportError:
+    _SESSION.headers['Accept-Encoding'] = 'gzip, deflate'
+
+
+# Fastest available JSON parser: orjson, then pysimdjson, then the stdlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+# ijson decodes item responses incrementally, one feature at a time
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+if orjson is not None:
+    _loads = orjson.loads
+elif simdjson is not None:
+    def _loads(data):
+        # A Parser's documents die with its next parse, so one per call
+        return simdjson.Parser().parse(data).as_dict()
+else:
+    _loads = json.loads
+
+
+def _parse_json(response):
+    """Decode a response body with the fastest available parser"""
+    return _loads(response.content)
+
+
+def _parse_features(response):
+    """Features of an items response, keeping only id, properties.datetime and assets.
+    
+    With ijson the body is streamed and reduced feature by feature, so
+    neither the raw body nor any geometry is held in memory. With pysimdjson
+    the document is walked lazily, so geometry and unused properties are
+    never decoded into Python objects.
+    """
+    if ijson is not None and not response.raw.closed:
+        response.raw.decode_content = True
+        features = []
+        for feature in ijson.items(response.raw, 'features.item', use_float=True,
+                                   buf_size=64 * 1024):
+            properties = feature.get('properties') or {}
+            reduced = {'properties': {}, 'assets': feature.get('assets') or {}}
+            if 'id' in feature:
+                reduced['id'] = feature['id']
+            if 'datetime' in properties:
+                reduced['properties']['datetime'] = properties['datetime']
+            features.append(reduced)
+        return features
+    
+    if simdjson is None:
+        return _parse_json(response).get('features', [])
+    
+    parser = simdjson.Parser()
+    doc = parser.parse(response.content)
+    features = []
+    for feature in doc.get('features') or []:
+        properties = feature.get('properties') or {}
+        reduced = {'properties': {}}
+        if 'id' in feature:
+            reduced['id'] = feature['id']
+        if 'datetime' in properties:
+            reduced['properties']['datetime'] = properties['datetime']
+        assets = feature.get('assets')
+        reduced['assets'] = assets.as_dict() if assets is not None else {}
+        features.append(reduced)
+    return features
+
+
+def _get_page(url):
+    """GET one STAC page, returning the decoded body or None on a non-200"""
+    response = _SESSION.get(url, timeout=10)
+    if response.status_code != 200:
+        return None
+    return _parse_json(response)
+
+
+def _next_link(data, stac_url):
+    """Absolute href of the rel="next" link in a STAC page, or None"""
+    for link in data.get('links', []):
+        if link.get('rel') == 'next':
+            next_url = link.get('href')
+            if next_url and not next_url.startswith('http'):
+                next_url = stac_url.rstrip('/') + '/' + next_url.lstrip('/')
+            return next_url
+    return None
+
+
+def _iter_collection_pages(stac_url, status, max_pages=10):
+    """Yield each /collections page while the next one is already being fetched.
+    
+    status['complete'] is set once the listing ends without a failed page.
+    """
+    status['complete'] = False
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(_get_page, f"{stac_url}/collections?limit=50")
+        for page_count in range(max_pages):  # Limit pages for performance
+            data = pending.result()
+            if data is None:
+                return
+            
+            next_url = _next_link(data, stac_url)
+            if next_url and page_count + 1 < max_pages:
+                pending = executor.submit(_get_page, next_url)
+            else:
+                pending = None
+            
+            yield data.get('collections', [])
+            
+            if pending is None:
+                status['complete'] = True
+                return
+
+
+_TIFF_SUFFIXES = ('.tif', '.tiff')
+_TO_BACKSLASH = str.maketrans('/', '\\')
+
+
+def _cog_assets(assets):
+    """(asset_name, s3_path or None, asset_info, http_href) for each COG/raster asset"""
+    cog_assets = []
+    for asset_name, asset_info in assets.items():
+        href = asset_info.get('href', '')
+        asset_type = asset_info.get('type', '')
+        
+        # Skip non-raster assets (thumbnails, metadata, ...) before any
+        # further work. COGs are recognised from the media type, roles and
+        # extension only; stringifying the whole asset (raster:bands and
+        # all) just to search it is wasted work
+        if not ('image/tiff' in asset_type or 
+                'cloud-optimized' in asset_type or 
+                href.lower().endswith(_TIFF_SUFFIXES) or 
+                'cloud-optimized' in (asset_info.get('roles') or ())):
+            continue
+        
+        # Store both S3 and HTTP URLs
+        http_href = href
+        s3_path = None
+        
+        # Convert URLs to S3 paths if possible
+        url = urlsplit(href)
+        if url.scheme == 's3':
+            s3_path = href
+        elif url.netloc.endswith('amazonaws.com') and ('.s3.' in url.netloc or '.s3-' in url.netloc):
+            # Virtual-hosted S3 URL: bucket is the first host label
+            bucket_part = url.netloc.partition('.')[0]
+            s3_path = f"s3://{bucket_part}/{url.path.lstrip('/')}"
+        
+        if s3_path:
+            cog_assets.append((asset_name, s3_path, asset_info, http_href))
+        elif href.startswith('http'):
+            # Even without S3, we might be able to use HTTP
+            cog_assets.append((asset_name, None, asset_info, http_href))
+    return cog_assets
+
+
+_HEADER_BYTES = 16384
+
+
+def _warm_header(url):
+    """Read at most the first 16 KiB of a COG, even if the server ignores Range"""
+    with _SESSION.get(url, timeout=5, stream=True,
+                      headers={'Range': f'bytes=0-{_HEADER_BYTES - 1}'}) as response:
+        response.raw.read(_HEADER_BYTES)
+
+
+# Output table columns and their text lengths
+_TABLE_FIELDS = (("item_id", 100), ("asset_name", 50), ("s3_path", 500),
+                 ("full_path", 500), ("datetime", 30))
+
+
+_COLLECTIONS_TTL = 3600
+_COLLECTION_FIELDS = ('id', 'title', 'description', 'keywords')
+
+
+def _collections_cache_path(stac_url):
+    digest = hashlib.md5(stac_url.encode('utf-8')).hexdigest()
+    return os.path.join(tempfile.gettempdir(), f"stac_collections_{digest}.json")
+
+
+def _load_cached_collections(stac_url):
+    """Collections cached for this STAC URL within the TTL, or None"""
+    path = _collections_cache_path(stac_url)
+    try:
+        if time.time() - os.path.getmtime(path) > _COLLECTIONS_TTL:
+            return None
+        with open(path, 'rb') as f:
+            return _loads(f.read())['collections']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _save_cached_collections(stac_url, collections):
+    try:
+        with open(_collections_cache_path(stac_url), 'w') as f:
+            json.dump({'collections': collections}, f)
+    except OSError:
+        pass
 
 class BrowseAndRenderSTAC(object):
     """Step 3: Browse and Render STAC Items"""
     
+    # Substring match, as before: "wildfire" and "floods" still count
+    _DISASTER_RE = re.compile(r'disaster|flood|fire|hurricane|earthquake|landslide|drought|volcano',
+                              re.I)
+    
+    # Dropdown display string -> collection id, filled by populate_collections.
+    # Class-level because ArcGIS may run execute on a different tool instance.
+    _display_to_id = {}
+    
     def __init__(self):
         self.label = "Step 3: Browse and Render STAC Items"
         self.description = """Browse STAC catalogs and add items to the map.
@@ -161,67 +389,52 @@ class BrowseAndRenderSTAC(object):
         parameters[2].filter.list = ["Loading collections..."]
         
         try:
-            # Fetch collections
-            all_collections = []
-            next_url = f"{stac_url}/collections?limit=50"
-            page_count = 0
-            
-            while next_url and page_count < 10:  # Limit pages for performance
-                response = requests.get(next_url, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    collections = data.get('collections', [])
-                    all_collections.extend(collections)
-                    
-                    # Look for next page
-                    next_url = None
-                    links = data.get('links', [])
-                    for link in links:
-                        if link.get('rel') == 'next':
-                            next_url = link.get('href')
-                            if next_url and not next_url.startswith('http'):
-                                next_url = stac_url.rstrip('/') + '/' + next_url.lstrip('/')
-                            break
-                    page_count += 1
-                else:
-                    break
-            
-            # Create display list
-            collection_list = []
-            for coll in all_collections:
-                coll_id = coll.get('id', '')
-                title = coll.get('title', coll_id)
-                
-                # Look for keywords that might indicate disaster relevance
-                description = coll.get('description', '').lower()
-                keywords = coll.get('keywords', [])
-                
-                disaster_related = any(term in description or term in str(keywords).lower() 
-                                     for term in ['disaster', 'flood', 'fire', 'hurricane', 
-                                               'earthquake', 'landslide', 'drought', 'volcano'])
-                
-                # Format display
-                if title and title != coll_id:
-                    display = f"{coll_id} - {title[:60]}"
-                else:
-                    display = coll_id
+            # Reuse a recent listing; otherwise fetch collections, building
+            # display entries for each page while the next page downloads
+            cached = _load_cached_collections(stac_url)
+            status = {}
+            pages = [cached] if cached is not None else _iter_collection_pages(stac_url, status)
+            fetched = []
+            disaster_cols = []
+            other_cols = []
+            for collections in pages:
+                for coll in collections:
+                    if cached is None:
+                        fetched.append({k: coll[k] for k in _COLLECTION_FIELDS if k in coll})
+                    coll_id = coll.get('id', '')
+                    title = coll.get('title', coll_id)
                     
-                # Add indicator for disaster-related collections
-                if disaster_related:
-                    display = f"[DISASTER] {display}"
+                    # Look for keywords that might indicate disaster relevance
+                    hay = f"{coll.get('description', '')} {' '.join(map(str, coll.get('keywords', [])))}"
+                    disaster_related = bool(self._DISASTER_RE.search(hay))
                     
-                collection_list.append(display)
+                    # Format display
+                    if title and title != coll_id:
+                        display = f"{coll_id} - {title[:60]}"
+                    else:
+                        display = coll_id
+                        
+                    # Add indicator for disaster-related collections
+                    if disaster_related:
+                        display = f"[DISASTER] {display}"
+                        disaster_cols.append(display)
+                    else:
+                        other_cols.append(display)
+                    self._display_to_id[display] = coll_id
+            
+            # A listing cut short by a failed page is shown but not cached
+            if fetched and status.get('complete'):
+                _save_cached_collections(stac_url, fetched)
             
-            if collection_list:
+            if disaster_cols or other_cols:
+                # Default to the first collection listed, preferring disaster ones
+                default = disaster_cols[0] if disaster_cols else other_cols[0]
+                
                 # Sort with disaster collections first
-                disaster_cols = [c for c in collection_list if c.startswith("[DISASTER]")]
-                other_cols = [c for c in collection_list if not c.startswith("[DISASTER]")]
-                parameters[2].filter.list = sorted(disaster_cols) + sorted(other_cols)
-                if disaster_cols:
-                    parameters[2].value = disaster_cols[0]
-                else:
-                    parameters[2].value = collection_list[0]
+                disaster_cols.sort()
+                other_cols.sort()
+                parameters[2].filter.list = disaster_cols + other_cols
+                parameters[2].value = default
             else:
                 parameters[2].filter.list = ["No collections found"]
                 
@@ -246,7 +459,8 @@ class BrowseAndRenderSTAC(object):
         messages.addMessage("=== Step 3: Browse and Render STAC Items ===")
         
         # Extract collection ID from display
-        collection = collection_display.replace("[DISASTER] ", "").split(" - ")[0]
+        collection = (self._display_to_id.get(collection_display)
+                      or collection_display.removeprefix("[DISASTER] ").split(" - ")[0])
         
         # Extract bucket name from ACS file
         acs_name = os.path.basename(acs_file).replace('.acs', '')
@@ -256,20 +470,22 @@ class BrowseAndRenderSTAC(object):
         try:
             # Build query parameters
             query_params = {"limit": limit}
+            # POST /search body: same filters, and only the fields used below
+            search_body = {
+                "collections": [collection],
+                "limit": limit,
+                "fields": {
+                    "include": ["id", "properties.datetime", "assets"],
+                    "exclude": ["geometry", "links", "stac_extensions"]
+                }
+            }
             
             # Add date filter if provided
             if start_date or end_date:
-                datetime_filter = []
-                if start_date:
-                    datetime_filter.append(start_date.strftime('%Y-%m-%dT%H:%M:%S') + 'Z')
-                else:
-                    datetime_filter.append('..')
-                datetime_filter.append('/')
-                if end_date:
-                    datetime_filter.append(end_date.strftime('%Y-%m-%dT%H:%M:%S') + 'Z')
-                else:
-                    datetime_filter.append('..')
-                query_params['datetime'] = ''.join(datetime_filter)
+                start = start_date.isoformat(timespec='seconds') + 'Z' if start_date else '..'
+                end = end_date.isoformat(timespec='seconds') + 'Z' if end_date else '..'
+                query_params['datetime'] = f"{start}/{end}"
+                search_body['datetime'] = query_params['datetime']
             
             # Add bbox filter if using map extent
             if use_extent:
@@ -283,23 +499,31 @@ class BrowseAndRenderSTAC(object):
                             extent = extent.projectAs(arcpy.SpatialReference(4326))
                         bbox = f"{extent.XMin},{extent.YMin},{extent.XMax},{extent.YMax}"
                         query_params['bbox'] = bbox
+                        search_body['bbox'] = [extent.XMin, extent.YMin, extent.XMax, extent.YMax]
                         messages.addMessage(f"Using map extent: {bbox}")
                 except:
                     messages.addMessage("Could not get map extent, proceeding without spatial filter")
             
             # Query STAC API
-            items_url = f"{stac_url}/collections/{collection}/items"
-            messages.addMessage(f"\nQuerying: {items_url}")
+            search_url = f"{stac_url}/search"
+            messages.addMessage(f"\nQuerying: {search_url}")
             
-            response = requests.get(items_url, params=query_params, timeout=30)
+            response = _SESSION.post(search_url, json=search_body, stream=True, timeout=30)
+            
+            if response.status_code != 200:
+                # Not every catalog supports POST /search; use the items endpoint
+                items_url = f"{stac_url}/collections/{collection}/items"
+                messages.addMessage(f"  /search returned {response.status_code}, querying: {items_url}")
+                # Unread streamed body: close it so its connection goes back to the pool
+                response.close()
+                response = _SESSION.get(items_url, params=query_params, stream=True, timeout=30)
             
             if response.status_code != 200:
                 messages.addErrorMessage(f"STAC query failed: {response.status_code}")
                 messages.addMessage(response.text)
                 return
             
-            data = response.json()
-            features = data.get('features', [])
+            features = _parse_features(response)
             messages.addMessage(f"\nFound {len(features)} items")
             
             if not features:
@@ -310,47 +534,39 @@ class BrowseAndRenderSTAC(object):
             items_added = 0
             s3_paths = []
             
+            # Find every item's COG assets up front and start fetching each
+            # COG's header block, warming DNS and server/CDN caches while the
+            # main thread works through addDataFromPath
+            item_assets = [_cog_assets(feature.get('assets', {})) for feature in features]
+            if add_to_map:
+                executor = ThreadPoolExecutor(max_workers=8)
+                for cog_assets in item_assets:
+                    for _, _, _, http_href in cog_assets:
+                        if http_href.startswith('http'):
+                            executor.submit(_warm_header, http_href)
+                executor.shutdown(wait=False)
+            
+            acs_prefix = acs_file + "\\"
+            
+            # Look up the project and map once rather than per asset; without a
+            # map the assets are still listed, just not added
+            add_data = None
+            if add_to_map:
+                try:
+                    add_data = arcpy.mp.ArcGISProject("CURRENT").activeMap.addDataFromPath
+                except Exception as e:
+                    messages.addMessage(f"  [-] Could not open the current map, layers will not be added: {str(e)}")
+            
             for i, feature in enumerate(features):
                 item_id = feature.get('id', f'item_{i}')
                 properties = feature.get('properties', {})
-                assets = feature.get('assets', {})
                 
                 # Show item info
                 messages.addMessage(f"\n[{i+1}/{len(features)}] Item: {item_id}")
                 if 'datetime' in properties:
                     messages.addMessage(f"  Date: {properties['datetime']}")
                 
-                # Look for COG assets
-                cog_assets = []
-                for asset_name, asset_info in assets.items():
-                    href = asset_info.get('href', '')
-                    asset_type = asset_info.get('type', '')
-                    
-                    # Check if it's a COG or raster
-                    if ('image/tiff' in asset_type or 
-                        'cloud-optimized' in str(asset_info) or 
-                        href.endswith(('.tif', '.tiff', '.TIF', '.TIFF'))):
-                        
-                        # Store both S3 and HTTP URLs
-                        http_href = href
-                        s3_path = None
-                        
-                        # Convert URLs to S3 paths if possible
-                        if href.startswith('s3://'):
-                            s3_path = href
-                        elif 'amazonaws.com' in href:
-                            # Try to extract S3 path from HTTP URL
-                            parts = href.split('/')
-                            if '.s3.' in href or '.s3-' in href:
-                                bucket_part = parts[2].split('.')[0]
-                                key_part = '/'.join(parts[3:])
-                                s3_path = f"s3://{bucket_part}/{key_part}"
-                        
-                        if s3_path:
-                            cog_assets.append((asset_name, s3_path, asset_info, http_href))
-                        elif href.startswith('http'):
-                            # Even without S3, we might be able to use HTTP
-                            cog_assets.append((asset_name, None, asset_info, http_href))
+                cog_assets = item_assets[i]
                 
                 # Add COG assets to map
                 if cog_assets and add_to_map:
@@ -358,27 +574,22 @@ class BrowseAndRenderSTAC(object):
                         if s3_path:
                             # Try S3 access first
                             # Extract bucket and key from S3 path
-                            bucket = s3_path.replace('s3://', '').split('/')[0]
-                            key = '/'.join(s3_path.replace('s3://', '').split('/')[1:])
+                            bucket, _, key = s3_path[len('s3://'):].partition('/')
                             
                             # Build full path with ACS connection
-                            key_windows = key.replace('/', '\\')
-                            full_path = acs_file + "\\" + key_windows
+                            full_path = acs_prefix + key.translate(_TO_BACKSLASH)
                             
                             messages.addMessage(f"  Asset: {asset_name}")
                             messages.addMessage(f"  S3: {s3_path}")
                             messages.addMessage(f"  ACS path: {full_path}")
                             
-                            if add_to_map:
+                            if add_data:
                                 try:
-                                    aprx = arcpy.mp.ArcGISProject("CURRENT")
-                                    active_map = aprx.activeMap
-                                    
                                     # Create a unique layer name
                                     layer_name = f"{collection}_{item_id}_{asset_name}"[:100]
                                     
                                     # Add to map
-                                    active_map.addDataFromPath(full_path)
+                                    add_data(full_path)
                                     messages.addMessage(f"  [+] Added to map: {layer_name}")
                                     items_added += 1
                                     
@@ -389,7 +600,7 @@ class BrowseAndRenderSTAC(object):
                                     if http_href and http_href.startswith('http'):
                                         messages.addMessage(f"  Trying HTTP access: {http_href}")
                                         try:
-                                            active_map.addDataFromPath(http_href)
+                                            add_data(http_href)
                                             messages.addMessage(f"  [+] Added via HTTP!")
                                             items_added += 1
                                         except Exception as e2:
@@ -398,15 +609,13 @@ class BrowseAndRenderSTAC(object):
                                             messages.addMessage("  The API 'get-s3-upload-creds' provides WRITE access to nasa-disasters")
                                             messages.addMessage("  But not READ access to veda-data-store-dev")
                         
-                        elif http_href and http_href.startswith('http'):
+                        elif add_data and http_href and http_href.startswith('http'):
                             # No S3 path, try HTTP directly
                             messages.addMessage(f"  Asset: {asset_name}")
                             messages.addMessage(f"  HTTP: {http_href}")
                             
                             try:
-                                aprx = arcpy.mp.ArcGISProject("CURRENT")
-                                active_map = aprx.activeMap
-                                active_map.addDataFromPath(http_href)
+                                add_data(http_href)
                                 messages.addMessage(f"  [+] Added via HTTP!")
                                 items_added += 1
                             except Exception as e:
@@ -425,28 +634,32 @@ class BrowseAndRenderSTAC(object):
             if output_table and s3_paths:
                 messages.addMessage(f"\nCreating output table...")
                 
-                # Create table
-                arcpy.management.CreateTable(os.path.dirname(output_table), 
-                                           os.path.basename(output_table))
-                
-                # Add fields
-                arcpy.management.AddField(output_table, "item_id", "TEXT", field_length=100)
-                arcpy.management.AddField(output_table, "asset_name", "TEXT", field_length=50)
-                arcpy.management.AddField(output_table, "s3_path", "TEXT", field_length=500)
-                arcpy.management.AddField(output_table, "full_path", "TEXT", field_length=500)
-                arcpy.management.AddField(output_table, "datetime", "TEXT", field_length=30)
+                # None -> '' so both write paths store the same value ('None' in a numpy text field otherwise)
+                rows = [(item['item_id'], item['asset'], item['s3_path'] or '',
+                         item['full_path'] or '', item['datetime'] or '')
+                        for item in s3_paths]
                 
-                # Insert rows
-                with arcpy.da.InsertCursor(output_table, 
-                    ["item_id", "asset_name", "s3_path", "full_path", "datetime"]) as cursor:
-                    for item in s3_paths:
-                        cursor.insertRow([
-                            item['item_id'],
-                            item['asset'],
-                            item['s3_path'],
-                            item['full_path'],
-                            item['datetime']
-                        ])
+                if len(rows) > 1000:
+                    # Large tables: one bulk write from a structured array
+                    import numpy
+                    array = numpy.array(rows, dtype=[(name, f"U{length}")
+                                                     for name, length in _TABLE_FIELDS])
+                    arcpy.da.NumPyArrayToTable(array, output_table)
+                else:
+                    # Create table
+                    arcpy.management.CreateTable(os.path.dirname(output_table), 
+                                               os.path.basename(output_table))
+                    
+                    # Add fields
+                    for name, length in _TABLE_FIELDS:
+                        arcpy.management.AddField(output_table, name, "TEXT", field_length=length)
+                    
+                    # Insert rows
+                    with arcpy.da.InsertCursor(output_table,
+                                               [name for name, _ in _TABLE_FIELDS]) as cursor:
+                        insert_row = cursor.insertRow
+                        for row in rows:
+                            insert_row(row)
                 
                 messages.addMessage(f"Created table with {len(s3_paths)} records")
             
@@ -3,20 +3,188 @@ import os
 import requests
 import json
 import tempfile
+import shutil
 import hashlib
 import hmac
+import binascii
+import time
+import functools
 from datetime import datetime, timezone
-import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter, Retry
+
+
+# orjson when available: parses the response bytes directly
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+# One keep-alive pool so repeated downloads from a bucket reuse the TLS connection
+_SESSION = requests.Session()
+_SESSION.headers['Connection'] = 'keep-alive'
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=64,
+                                       max_retries=Retry(total=2, backoff_factor=0.2,
+                                                         status_forcelist=[429, 500, 502, 503, 504],
+                                                         raise_on_status=False)))
+
+
+def _expiry_epoch(expiration):
+    """STS Expiration (ISO 8601) as epoch seconds, or None if absent/unparseable"""
+    try:
+        expiry = datetime.fromisoformat(expiration.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    if expiry.tzinfo is None:
+        expiry = expiry.replace(tzinfo=timezone.utc)
+    return expiry.timestamp()
+
+
+_TRANSFER_CONFIG = None
+
+
+def _s3_client(access_key, secret_key, session_token):
+    """A boto3 S3 client for these credentials, or None when boto3 isn't installed"""
+    global _TRANSFER_CONFIG
+    try:
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+    except ImportError:
+        return None
+    
+    if _TRANSFER_CONFIG is None:
+        _TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * 1024 * 1024,
+                                          multipart_chunksize=8 * 1024 * 1024,
+                                          max_concurrency=8)
+    session = boto3.session.Session(aws_access_key_id=access_key,
+                                    aws_secret_access_key=secret_key,
+                                    aws_session_token=session_token,
+                                    region_name='us-west-2')
+    return session.client('s3', config=Config(max_pool_connections=16,
+                                              s3={'use_accelerate_endpoint': False}))
+
+
+# Constant SigV4 fragments, as bytes ready for hashing
+_ALGORITHM = b"AWS4-HMAC-SHA256"
+# Canonical request templates keyed on (has range, has session token), with the
+# matching SignedHeaders. Slots: method, path, host[, range][, token], payload hash
+_CANONICAL_TEMPLATES = {
+    (False, False): (b"%b\n%b\n\nhost:%b\n\nhost\n%b", "host"),
+    (False, True): (b"%b\n%b\n\nhost:%b\nx-amz-security-token:%b\n\nhost;x-amz-security-token\n%b",
+                    "host;x-amz-security-token"),
+    (True, False): (b"%b\n%b\n\nhost:%b\nrange:%b\n\nhost;range\n%b", "host;range"),
+    (True, True): (b"%b\n%b\n\nhost:%b\nrange:%b\nx-amz-security-token:%b\n\nhost;range;x-amz-security-token\n%b",
+                   "host;range;x-amz-security-token"),
+}
+# SHA-256 of an empty body, the payload hash of every GET we sign
+_EMPTY_SHA256_HEX = binascii.hexlify(hashlib.sha256(b'').digest())
+
+# Objects at least this big are fetched as parallel signed Range GETs
+_RANGED_MIN_SIZE = 16 * 1024 * 1024
+_RANGE_PARTS = 8
+# Statuses S3 returns when the endpoint or region is wrong rather than the request
+_REGIONAL_ERRORS = (301, 307, 400)
+
+
+def _signing_key(secret_key, date_stamp, region, service):
+    """Derive the SigV4 signing key for one day/region/service scope"""
+    def sign(key, msg):
+        # One-shot OpenSSL HMAC: no Python-level HMAC object per step
+        return hmac.digest(key, msg.encode('utf-8'), 'sha256')
+    
+    k_date = sign(f"AWS4{secret_key}".encode('utf-8'), date_stamp)
+    k_region = sign(k_date, region)
+    k_service = sign(k_region, service)
+    return sign(k_service, "aws4_request")
+
+
+@functools.lru_cache(maxsize=8)
+def _signing_hmac(k_signing):
+    # Copying a pre-keyed HMAC skips the key padding and inner/outer setup
+    return hmac.new(k_signing, digestmod='sha256')
+
+
+def _sign(method, host, path, amz_date, k_signing, access_key, session_token, region, service,
+          range_header=None, payload_hash=_EMPTY_SHA256_HEX):
+    """SigV4 headers for one request; a pure function of plain str/bytes arguments"""
+    # Fill the precompiled canonical request; headers are in sorted order
+    template, signed_headers = _CANONICAL_TEMPLATES[(bool(range_header), bool(session_token))]
+    slots = [method.encode('ascii'), path.encode('utf-8'), host.encode('utf-8')]
+    if range_header:
+        slots.append(range_header.encode('ascii'))
+    if session_token:
+        slots.append(session_token.encode('utf-8'))
+    slots.append(payload_hash)
+    canonical_request = template % tuple(slots)
+    
+    # Create string to sign
+    credential_scope = f"{amz_date[:8]}/{region}/{service}/aws4_request"
+    string_to_sign = b"\n".join([_ALGORITHM, amz_date.encode('ascii'),
+                                 credential_scope.encode('utf-8'),
+                                 # hexlify yields the hex as bytes, with no str round trip
+                                 binascii.hexlify(hashlib.sha256(canonical_request).digest())])
+    
+    mac = _signing_hmac(k_signing).copy()
+    mac.update(string_to_sign)
+    
+    headers = {
+        'Host': host,
+        'X-Amz-Date': amz_date,
+        'Authorization': f"AWS4-HMAC-SHA256 Credential={access_key}/{credential_scope}, "
+                         f"SignedHeaders={signed_headers}, Signature={mac.hexdigest()}"
+    }
+    if range_header:
+        headers['Range'] = range_header
+    if session_token:
+        headers['X-Amz-Security-Token'] = session_token
+    return headers
+
+
+def _preallocate(f, size):
+    """Reserve size bytes up front so big GeoTIFFs land in few extents (POSIX only)"""
+    if size and hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+        except OSError:
+            pass
+
+
+def _local_path(temp_dir, bucket, key):
+    """temp_dir/bucket/key, so keys sharing a basename never share a file"""
+    parts = [part for part in key.split('/') if part not in ('', '.', '..')]
+    local_file = os.path.join(temp_dir, bucket, *parts)
+    os.makedirs(os.path.dirname(local_file), exist_ok=True)
+    return local_file
+
+
+def _save(response, local_file):
+    """Stream a response body to disk with a 1 MiB copy buffer, returning the bytes written"""
+    response.raw.decode_content = True
+    with open(local_file, 'wb', buffering=1024 * 1024) as f:
+        # Content-Length is only the on-disk size when the body isn't encoded
+        if 'Content-Encoding' not in response.headers:
+            _preallocate(f, int(response.headers.get('Content-Length', 0)))
+        shutil.copyfileobj(response.raw, f, length=1024 * 1024)
+        # The write position is the size, so no stat() afterwards
+        return f.tell()
 
 class BrowseSTACWithAWSAuth(object):
     """Browse STAC and download using manual AWS signature authentication"""
     
+    # (cred_api_url, sha256(api_key)) -> (credentials, expiry as epoch seconds)
+    _cred_cache = {}
+    
     def __init__(self):
         self.label = "Step 3 Final: STAC with AWS Auth"
         self.description = """Browse STAC and download files using AWS Signature V4 authentication.
         
         This tool manually signs S3 requests with temporary credentials including session tokens."""
         self.canRunInBackground = False
+        # (date, region, service, sha256(secret)) -> SigV4 signing key
+        self._sk_cache = {}
 
     def getParameterInfo(self):
         params = []
@@ -79,60 +247,146 @@ class BrowseSTACWithAWSAuth(object):
         
         return params
 
-    def sign_request_v4(self, method, url, headers, payload, access_key, secret_key, session_token, region, service):
+    def sign_request_v4(self, method, host, path, payload, access_key, secret_key, session_token, region, service, range_header=None):
         """Manually implement AWS Signature V4"""
         
-        # Parse URL
-        parsed = urllib.parse.urlparse(url)
-        host = parsed.netloc
-        path = parsed.path or '/'
+        amz_date = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        date_stamp = amz_date[:8]
         
-        # Create canonical request
-        canonical_headers = f"host:{host}\n"
-        if session_token:
-            canonical_headers += f"x-amz-security-token:{session_token}\n"
+        # The signing key only changes with the day, scope or secret, so derive
+        # it once and reuse it for every asset (keyed on a hash of the secret)
+        cache_key = (date_stamp, region, service, hashlib.sha256(secret_key.encode('utf-8')).digest())
+        k_signing = self._sk_cache.get(cache_key)
+        if k_signing is None:
+            k_signing = _signing_key(secret_key, date_stamp, region, service)
+            self._sk_cache[cache_key] = k_signing
         
-        signed_headers = "host"
-        if session_token:
-            signed_headers += ";x-amz-security-token"
-            
-        payload_hash = hashlib.sha256(payload.encode() if payload else b'').hexdigest()
+        payload_hash = binascii.hexlify(hashlib.sha256(payload.encode()).digest()) if payload else _EMPTY_SHA256_HEX
+        return _sign(method, host, path, amz_date, k_signing, access_key, session_token,
+                     region, service, range_header, payload_hash)
+
+    def _signed_request(self, method, host, path, credentials, range_header=None, region="us-west-2"):
+        # Callers know the host and path already, so there's no URL to parse
+        access_key, secret_key, session_token = credentials
+        signed_headers = self.sign_request_v4(
+            method=method,
+            host=host,
+            path=path,
+            payload="",
+            access_key=access_key,
+            secret_key=secret_key,
+            session_token=session_token,
+            region=region,
+            service="s3",
+            range_header=range_header
+        )
+        return _SESSION.request(method, f"https://{host}{path}", headers=signed_headers, stream=True)
+
+    def _fetch_range(self, host, path, credentials, local_file, start, end):
+        """Worker: signed Range GET of bytes start..end written in place, returning the status code"""
+        with self._signed_request("GET", host, path, credentials, f"bytes={start}-{end}") as response:
+            if response.status_code != 206:
+                return response.status_code
+            response.raw.decode_content = True
+            # Each range gets its own handle, so seek + write works on Windows too
+            with open(local_file, 'r+b') as f:
+                f.seek(start)
+                shutil.copyfileobj(response.raw, f, length=1024 * 1024)
+        return 206
+
+    def _ranged_get(self, host, path, credentials, size, local_file):
+        """Download a large object as parallel signed Range GETs into a preallocated file"""
+        with open(local_file, 'wb') as f:
+            _preallocate(f, size)
+            f.truncate(size)
         
-        canonical_request = f"{method}\n{path}\n\n{canonical_headers}\n{signed_headers}\n{payload_hash}"
+        part = -(-size // _RANGE_PARTS)
+        ranges = [(start, min(start + part, size) - 1) for start in range(0, size, part)]
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            statuses = list(pool.map(lambda r: self._fetch_range(host, path, credentials, local_file, *r), ranges))
+        return all(status == 206 for status in statuses)
+
+    def _download_asset(self, credentials, s3, local_file, bucket, key):
+        """Worker: signed download of one object, returning (local file or None, log lines)"""
+        log = []
+        if s3 is not None:
+            # boto3's signer and s3transfer's parallel ranged GETs, when available
+            try:
+                s3.download_file(bucket, key, local_file, Config=_TRANSFER_CONFIG)
+                file_size = os.path.getsize(local_file) / (1024 * 1024)  # MB
+                log.append(f"  [+] Downloaded with boto3: {file_size:.1f} MB")
+                return local_file, log
+            except Exception as e:
+                log.append(f"  [-] boto3 download failed: {str(e)}")
+                log.append("  Falling back to manual signing...")
         
-        # Create string to sign
-        algorithm = "AWS4-HMAC-SHA256"
-        now = datetime.now(timezone.utc)
-        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
-        date_stamp = now.strftime('%Y%m%d')
-        credential_scope = f"{date_stamp}/{region}/{service}/aws4_request"
+        try:
+            return self._fetch_asset(credentials, local_file, bucket, key, log), log
+        except (requests.RequestException, OSError) as e:
+            log.append(f"  [-] Download error: {str(e)}")
+            return None, log
+
+    def _fetch_asset(self, credentials, local_file, bucket, key, log):
+        # S3 REST API: virtual-hosted bucket
+        path = f"/{key}"
         
-        string_to_sign = f"{algorithm}\n{amz_date}\n{credential_scope}\n{hashlib.sha256(canonical_request.encode()).hexdigest()}"
+        host = f"{bucket}.s3.amazonaws.com"
         
-        # Calculate signature
-        def sign(key, msg):
-            return hmac.new(key, msg.encode('utf-8'), hashlib.sha256).digest()
+        # Large objects: HEAD for the size, then parallel ranged GETs
+        with self._signed_request("HEAD", host, path, credentials) as response:
+            size = int(response.headers.get('Content-Length', 0)) if response.status_code == 200 else 0
+        if size >= _RANGED_MIN_SIZE:
+            log.append(f"  Signing {_RANGE_PARTS} ranged requests and downloading...")
+            if self._ranged_get(host, path, credentials, size, local_file):
+                log.append(f"  [+] Downloaded: {size / (1024 * 1024):.1f} MB")
+                return local_file
+            log.append("  [-] Ranged download failed, retrying as a single request")
         
-        k_date = sign(f"AWS4{secret_key}".encode('utf-8'), date_stamp)
-        k_region = sign(k_date, region)
-        k_service = sign(k_region, service)
-        k_signing = sign(k_service, "aws4_request")
-        signature = hmac.new(k_signing, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+        return self._get_with_fallback(credentials, bucket, key, local_file, log)
+
+    def _get_with_fallback(self, credentials, bucket, key, local_file, log):
+        """Signed GET from the virtual-hosted bucket, then path-style only on a regional error"""
+        log.append("  Signing request and downloading...")
+        with self._signed_request("GET", f"{bucket}.s3.amazonaws.com", f"/{key}", credentials) as response:
+            if response.status_code == 200:
+                # Save to temp file, pumping bytes in 1 MiB blocks
+                bytes_written = _save(response, local_file)
+                log.append(f"  [+] Downloaded: {bytes_written / (1024 * 1024):.1f} MB")
+                return local_file
+            log.append(f"  [-] Download failed: {response.status_code}")
+            log.append(f"  Response: {response.text[:200]}")
+            region = response.headers.get('x-amz-bucket-region')
+            status = response.status_code
         
-        # Create authorization header
-        authorization = f"{algorithm} Credential={access_key}/{credential_scope}, SignedHeaders={signed_headers}, Signature={signature}"
+        # Another endpoint can't fix denied or missing objects, only a wrong region/URL
+        # shape, and only S3's own x-amz-bucket-region says which region to use
+        if not region or (region == "us-west-2" and status not in _REGIONAL_ERRORS):
+            return None
         
-        # Build final headers
-        final_headers = {
-            'Host': host,
-            'X-Amz-Date': amz_date,
-            'Authorization': authorization
-        }
+        # Try alternative approach, signed for the bucket's actual region
+        log.append(f"  Trying alternative S3 endpoint in {region}...")
+        alt_host = f"s3.{region}.amazonaws.com"
+        with self._signed_request("GET", alt_host, f"/{bucket}/{key}", credentials, region=region) as response:
+            if response.status_code == 200:
+                _save(response, local_file)
+                log.append(f"  [+] Downloaded via alt endpoint!")
+                return local_file
         
-        if session_token:
-            final_headers['X-Amz-Security-Token'] = session_token
-            
-        return final_headers
+        return None
+
+    def _add_as_mosaic(self, active_map, files, messages):
+        """Add downloaded rasters to the map as one mosaic dataset in the scratch GDB"""
+        try:
+            spatial_ref = arcpy.Describe(files[0]).spatialReference
+            mosaic = arcpy.CreateUniqueName("stac_mosaic", arcpy.env.scratchGDB)
+            arcpy.management.CreateMosaicDataset(arcpy.env.scratchGDB, os.path.basename(mosaic), spatial_ref)
+            arcpy.management.AddRastersToMosaicDataset(mosaic, "Raster Dataset", files)
+            active_map.addDataFromPath(mosaic)
+        except Exception as e:
+            messages.addMessage(f"  [-] Mosaic dataset failed, adding rasters individually: {str(e)}")
+            return False
+        messages.addMessage(f"  [+] Added {len(files)} rasters to map as {os.path.basename(mosaic)}")
+        return True
 
     def execute(self, parameters, messages):
         cred_api_url = parameters[0].valueAsText
@@ -145,16 +399,24 @@ class BrowseSTACWithAWSAuth(object):
         messages.addMessage("=== STAC Browser with AWS Authentication ===")
         
         try:
-            # Get credentials
-            messages.addMessage("Fetching temporary credentials...")
-            headers = {"api-key": api_key}
-            response = requests.get(cred_api_url, headers=headers, timeout=30)
-            
-            if response.status_code != 200:
-                messages.addErrorMessage(f"Failed to get credentials: {response.status_code}")
-                return
+            # Get credentials, reusing ones from an earlier run until a minute before expiry
+            cache_key = (cred_api_url, hashlib.sha256(api_key.encode('utf-8')).hexdigest())
+            creds, expires = self._cred_cache.get(cache_key, (None, 0))
+            if creds and time.time() < expires - 60:
+                messages.addMessage("Using cached temporary credentials")
+            else:
+                messages.addMessage("Fetching temporary credentials...")
+                headers = {"api-key": api_key}
+                response = _SESSION.get(cred_api_url, headers=headers, timeout=30)
                 
-            creds = response.json()
+                if response.status_code != 200:
+                    messages.addErrorMessage(f"Failed to get credentials: {response.status_code}")
+                    return
+                    
+                creds = _loads(response.content)
+                expires = _expiry_epoch(creds.get('Expiration'))
+                if expires:
+                    self._cred_cache[cache_key] = (creds, expires)
             access_key = creds.get('AccessKeyId')
             secret_key = creds.get('SecretAccessKey') 
             session_token = creds.get('SessionToken')
@@ -168,21 +430,32 @@ class BrowseSTACWithAWSAuth(object):
             # Query STAC
             messages.addMessage(f"\nQuerying collection: {collection}")
             items_url = f"{stac_url}/collections/{collection}/items?limit={limit}"
-            response = requests.get(items_url)
+            # Only id and assets are used (STAC fields extension; assets is keyed by name)
+            response = _SESSION.get(f"{items_url}&fields=id,assets", timeout=30)
+            data = _loads(response.content) if response.status_code == 200 else None
+            features = data.get('features', []) if data else []
+            if response.status_code == 400 or (features and not any(f.get('assets') for f in features)):
+                # Endpoint doesn't support the fields extension, or filtered the assets away
+                response = _SESSION.get(items_url, timeout=30)
+                data = None
             
             if response.status_code != 200:
                 messages.addErrorMessage(f"STAC query failed: {response.status_code}")
                 return
                 
-            data = response.json()
-            features = data.get('features', [])
+            if data is None:
+                data = _loads(response.content)
+                features = data.get('features', [])
             messages.addMessage(f"Found {len(features)} items")
             
-            # Create temp directory
-            temp_dir = tempfile.mkdtemp()
+            # The project's scratch folder, managed by ArcGIS; an OS temp dir outside Pro
+            temp_dir = arcpy.env.scratchFolder or tempfile.mkdtemp()
             downloaded_files = []
             
-            # Process each item
+            # Collect every signed download first so they can run concurrently,
+            # once per href and each into its own file
+            tasks = []
+            seen_hrefs = set()
             for feature in features:
                 item_id = feature.get('id')
                 assets = feature.get('assets', {})
@@ -194,96 +467,64 @@ class BrowseSTACWithAWSAuth(object):
                     asset_type = asset_info.get('type', '')
                     
                     if href.startswith('s3://') and 'image' in asset_type:
-                        # Parse S3 URL
-                        bucket = href.replace('s3://', '').split('/')[0]
-                        key = '/'.join(href.replace('s3://', '').split('/')[1:])
+                        if href in seen_hrefs:
+                            continue
+                        seen_hrefs.add(href)
+                        
+                        # Parse S3 URL: one partition on the first '/' after the scheme
+                        bucket, _, key = href[5:].partition('/')
                         
                         messages.addMessage(f"  Asset: {asset_name}")
                         messages.addMessage(f"  S3: {href}")
-                        
-                        # Build S3 REST API URL
-                        s3_url = f"https://{bucket}.s3.amazonaws.com/{key}"
-                        
-                        # Sign the request
-                        messages.addMessage("  Signing request...")
-                        signed_headers = self.sign_request_v4(
-                            method="GET",
-                            url=s3_url,
-                            headers={},
-                            payload="",
-                            access_key=access_key,
-                            secret_key=secret_key,
-                            session_token=session_token,
-                            region="us-west-2",
-                            service="s3"
-                        )
-                        
-                        # Download with signed request
-                        messages.addMessage("  Downloading...")
-                        response = requests.get(s3_url, headers=signed_headers, stream=True)
-                        
-                        if response.status_code == 200:
-                            # Save to temp file
-                            local_file = os.path.join(temp_dir, os.path.basename(key))
-                            with open(local_file, 'wb') as f:
-                                for chunk in response.iter_content(chunk_size=8192):
-                                    f.write(chunk)
-                                    
-                            file_size = os.path.getsize(local_file) / (1024 * 1024)  # MB
-                            messages.addMessage(f"  [+] Downloaded: {file_size:.1f} MB")
-                            downloaded_files.append(local_file)
-                            
-                            # Add to map
-                            if add_to_map:
-                                try:
-                                    aprx = arcpy.mp.ArcGISProject("CURRENT")
-                                    active_map = aprx.activeMap
-                                    active_map.addDataFromPath(local_file)
-                                    messages.addMessage(f"  [+] Added to map!")
-                                except Exception as e:
-                                    messages.addMessage(f"  [-] Failed to add to map: {str(e)}")
-                        else:
-                            messages.addMessage(f"  [-] Download failed: {response.status_code}")
-                            messages.addMessage(f"  Response: {response.text[:200]}")
-                            
-                            # Try alternative approach
-                            messages.addMessage("  Trying alternative S3 endpoint...")
-                            s3_url_alt = f"https://s3.{bucket.split('-')[-1]}.amazonaws.com/{bucket}/{key}"
-                            signed_headers = self.sign_request_v4(
-                                method="GET",
-                                url=s3_url_alt,
-                                headers={},
-                                payload="",
-                                access_key=access_key,
-                                secret_key=secret_key,
-                                session_token=session_token,
-                                region="us-west-2",
-                                service="s3"
-                            )
-                            
-                            response = requests.get(s3_url_alt, headers=signed_headers, stream=True)
-                            if response.status_code == 200:
-                                local_file = os.path.join(temp_dir, os.path.basename(key))
-                                with open(local_file, 'wb') as f:
-                                    for chunk in response.iter_content(chunk_size=8192):
-                                        f.write(chunk)
-                                messages.addMessage(f"  [+] Downloaded via alt endpoint!")
-                                downloaded_files.append(local_file)
-                                
-                                if add_to_map:
-                                    try:
-                                        aprx = arcpy.mp.ArcGISProject("CURRENT")
-                                        active_map = aprx.activeMap
-                                        active_map.addDataFromPath(local_file)
-                                        messages.addMessage(f"  [+] Added to map!")
-                                    except Exception as e:
-                                        messages.addMessage(f"  [-] Failed to add: {str(e)}")
+                        tasks.append((href, bucket, key, _local_path(temp_dir, bucket, key)))
+            
+            # Download on worker threads; they hand back their log lines and
+            # only the main thread talks to messages and arcpy.mp
+            credentials = (access_key, secret_key, session_token)
+            s3 = _s3_client(*credentials) if tasks else None
+            if s3 is not None:
+                messages.addMessage("\nUsing boto3 for downloads")
+            results = []
+            if tasks:
+                with ThreadPoolExecutor(max_workers=min(8, len(tasks))) as executor:
+                    results = list(executor.map(
+                        lambda t: self._download_asset(credentials, s3, t[3], t[1], t[2]), tasks))
+            
+            for (href, bucket, key, _), (local_file, log) in zip(tasks, results):
+                messages.addMessage(f"\n{href}")
+                for line in log:
+                    messages.addMessage(line)
+                if local_file:
+                    downloaded_files.append(local_file)
+            
+            # Add to map
+            if add_to_map and downloaded_files:
+                # One project/map lookup for the whole batch; a failure here skips adding
+                try:
+                    active_map = arcpy.mp.ArcGISProject("CURRENT").activeMap
+                except Exception as e:
+                    active_map = None
+                    messages.addMessage(f"  [-] Could not open the current map: {str(e)}")
+                # Several rasters go in as one mosaic dataset: a single layer-graph change
+                pending = downloaded_files if active_map is not None else []
+                if len(pending) > 1 and self._add_as_mosaic(active_map, pending, messages):
+                    pending = []
+                for local_file in pending:
+                    try:
+                        active_map.addDataFromPath(local_file)
+                        messages.addMessage(f"  [+] Added to map: {os.path.basename(local_file)}")
+                    except Exception as e:
+                        messages.addMessage(f"  [-] Failed to add {os.path.basename(local_file)}: {str(e)}")
             
             # Summary
             messages.addMessage(f"\n" + "="*50)
             messages.addMessage(f"Downloaded {len(downloaded_files)} files")
-            messages.addMessage(f"Temp location: {temp_dir}")
-            messages.addMessage("Files will remain until ArcGIS Pro is closed")
+            if temp_dir == arcpy.env.scratchFolder:
+                messages.addMessage(f"Saved to project scratch folder: {temp_dir}")
+                messages.addMessage("Files persist with the project until you delete them")
+            else:
+                messages.addMessage(f"Saved to temporary folder: {temp_dir}")
+                messages.addMessage("Files remain until the OS temp folder is cleaned")
             
             # Final option - try boto3 one more time
             if len(downloaded_files) == 0:
@@ -0,0 +1,65 @@
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _ExecuteError(Exception):
+    pass
+
+
+def _create_cloud_storage_connection_file(out_folder_path, out_name, service_provider, bucket_name,
+                                          access_key_id, secret_access_key, region):
+    """Stub that, like an arcpy build without the option, rejects any extra keyword"""
+    with open(os.path.join(out_folder_path, f"{out_name}.acs"), 'w') as f:
+        f.write(secret_access_key)
+
+
+def _stub_arcpy():
+    arcpy = types.ModuleType('arcpy')
+    arcpy.ExecuteError = _ExecuteError
+    arcpy.management = types.SimpleNamespace(
+        CreateCloudStorageConnectionFile=mock.Mock(side_effect=_create_cloud_storage_connection_file))
+    return arcpy
+
+
+class CreateACSFallbackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.arcpy = _stub_arcpy()
+        modules = {'arcpy': self.arcpy}
+        try:
+            import requests  # noqa: F401
+        except ImportError:
+            modules['requests'] = mock.MagicMock()
+            modules['requests.adapters'] = mock.MagicMock()
+        patcher = mock.patch.dict(sys.modules, modules)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sys.modules.pop('step2_create_acs_direct', None)
+        import step2_create_acs_direct
+        self.module = step2_create_acs_direct
+        self.module._acs_method = None
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_rejected_keyword_falls_back_to_next_method(self):
+        log = []
+        tool = self.module.CreateACSFromProfileDirect.__new__(self.module.CreateACSFromProfileDirect)
+        acs_path = tool._create_acs(log, self.tmp.name, "veda", "veda-data-store",
+                                    "AKID", "SECRET", "TOKEN", "us-west-2")
+
+        self.assertTrue(os.path.isfile(acs_path))
+        self.assertTrue(any(line.startswith("[-] Method 1 failed") for line in log))
+        self.assertIn("[+] Created with session token (method 2)", log)
+        self.assertEqual(self.module._acs_method, 2)
+        with open(acs_path) as f:
+            self.assertEqual(f.read(), "SECRET:TOKEN")
+
+
+if __name__ == '__main__':
+    unittest.main()